@@ -0,0 +1,53 @@
+import struct
+
+
+class Capture:
+    """ Compact binary capture of the datagrams received by a router. """
+    MAGIC = b"RIPC"
+    VERSION = 1
+    HEADER_FORMAT = "!4sBH"  # Magic, capture format version, router id.
+    RECORD_FORMAT = "!dHH"  # Receive timestamp, input port, datagram length. Followed by the datagram's bytes.
+
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+class CaptureWriter:
+    def __init__(self, filename, router_id):
+        """ Open a capture file for writing, appending to it if it already exists. """
+        self.capture_file = open(filename, "ab")
+        if self.capture_file.tell() == 0:
+            self.capture_file.write(struct.pack(Capture.HEADER_FORMAT, Capture.MAGIC, Capture.VERSION, router_id))
+
+    def write(self, timestamp, input_port, data):
+        """ Record a single received datagram. """
+        self.capture_file.write(struct.pack(Capture.RECORD_FORMAT, timestamp, input_port, len(data)) + data)
+
+    def flush(self):
+        self.capture_file.flush()
+
+    def close(self):
+        self.capture_file.close()
+
+
+def read_capture(filename):
+    """ Read a capture file. Return the router id it was captured by, and a list of (timestamp, port, data) records. """
+    with open(filename, "rb") as capture_file:
+        header = capture_file.read(Capture.HEADER_SIZE)
+        if len(header) < Capture.HEADER_SIZE:
+            raise ValueError("Invalid capture file: '" + filename + "', missing header")
+        magic, version, router_id = struct.unpack(Capture.HEADER_FORMAT, header)
+        if magic != Capture.MAGIC or version != Capture.VERSION:
+            raise ValueError("Invalid capture file: '" + filename + "', unknown format")
+
+        records = []
+        while True:
+            record = capture_file.read(Capture.RECORD_SIZE)
+            if len(record) < Capture.RECORD_SIZE:
+                break
+            timestamp, input_port, length = struct.unpack(Capture.RECORD_FORMAT, record)
+            data = capture_file.read(length)
+            if len(data) < length:
+                break  # Truncated final record, such as when the router was killed mid-write.
+            records.append((timestamp, input_port, data))
+    return router_id, records
@@ -1,3 +1,29 @@
+from prefix_trie import format_prefix, parse_prefix
+
+
+class Config:
+    """ Holds configuration values loaded for a router that is already running, such as when reloading. """
+    def __init__(self):
+        self.id = None
+        self.input_ports = []
+        self.outputs = {}
+        self.update_period = None
+        self.timeout_length = None
+        self.deletion_length = None
+        self.full_update_period = None
+        self.max_update_period = None
+        self.query_port = None
+        self.prefixes = []
+        self.summary_prefixes = []
+        self.hold_down = None
+        self.count_to_infinity_threshold = None
+        self.hello_interval = None
+        self.hello_multiplier = None
+        self.receive_buffer = None
+        self.send_buffer = None
+        self.send_pacing = None
+
+
 class Loader:
     MIN_PORT = 1024
     MAX_PORT = 64000
@@ -10,6 +36,12 @@ class Loader:
     DEFAULT_UPDATE_PERIOD = 30
     TIMEOUT_UPDATE_RATIO = 6
     DELETION_UPDATE_RATIO = 4
+    MAX_ADVERTISED_UPDATE_PERIOD = 65535  # Update periods are advertised to neighbours as 16-bit values.
+    # Hello intervals are advertised to neighbours in milliseconds as 16-bit values, and multipliers as 8-bit values.
+    MIN_HELLO_INTERVAL = 0.05  # Hellos are sent from the main loop, which can't keep to shorter intervals.
+    MAX_HELLO_INTERVAL = 65.535
+    MAX_HELLO_MULTIPLIER = 255
+    DEFAULT_HELLO_MULTIPLIER = 3
 
     def __init__(self, config_lines, router):
         self.config_lines = config_lines
@@ -19,12 +51,24 @@ class Loader:
             "router-id": self.process_router_id,
             "input-ports": self.process_input_ports,
             "outputs": self.process_outputs,
-            "update-period": self.process_update_period
+            "update-period": self.process_update_period,
+            "full-update-period": self.process_full_update_period,
+            "max-update-period": self.process_max_update_period,
+            "query-port": self.process_query_port,
+            "prefixes": self.process_prefixes,
+            "summary-prefixes": self.process_summary_prefixes,
+            "hold-down": self.process_hold_down,
+            "count-to-infinity-threshold": self.process_count_to_infinity_threshold,
+            "hello-interval": self.process_hello_interval,
+            "hello-multiplier": self.process_hello_multiplier,
+            "receive-buffer": self.process_receive_buffer,
+            "send-buffer": self.process_send_buffer,
+            "send-pacing": self.process_send_pacing
         }
         self.router = router
 
-    def load(self):
-        """ Load the configuration and set the router's variables """
+    def load(self, exit_on_error=True):
+        """ Load the configuration and set the router's variables. Raise ValueError instead of exiting if asked. """
         for line in self.config_lines:
             line = " ".join(line.split())  # Remove all leading, trailing, and consecutive whitespace.
             # Ignore any lines that are comments.
@@ -37,6 +81,10 @@ class Loader:
                     try:
                         self.config_functions[parts[0]](line)
                     except ValueError as value_error:
+                        if not exit_on_error:
+                            raise ValueError(
+                                "Error in configuration file on line " + str(self.line_number) + "\n" + str(value_error)
+                            )
                         print("Error in configuration file on line", self.line_number)
                         print(value_error)
                         print()
@@ -47,9 +95,24 @@ class Loader:
             self.router.update_period = self.DEFAULT_UPDATE_PERIOD
             self.process_timeouts()
 
+        if self.router.hello_interval is not None and self.router.hello_multiplier is None:
+            self.router.hello_multiplier = self.DEFAULT_HELLO_MULTIPLIER
+
+        max_update_period = self.router.max_update_period
+        if max_update_period is not None and max_update_period < self.router.update_period:
+            error = "Invalid max-update-period: '" + str(max_update_period) + "', less than the update-period"
+            if not exit_on_error:
+                raise ValueError(error)
+            print("Error in configuration file")
+            print(error)
+            print()
+            exit(11)
+
         if all([self.router.id, self.router.input_ports, self.router.outputs]):
             print("Configuration loaded!")
             print(self.get_pretty_config_values())
+        elif not exit_on_error:
+            raise ValueError("Incomplete configuration, 'router-id', 'input-ports', and 'outputs' required")
         else:
             print("Error in configuration file")
             print("Incomplete configuration, 'router-id', 'input-ports', and 'outputs' required")
@@ -71,6 +134,29 @@ class Loader:
                 ("Timeout Length", self.router.timeout_length),
                 ("Garbage Collection Timeout Length", self.router.deletion_length)
             ]
+            if self.router.full_update_period is not None:
+                config_values.append(("Full Update Period", self.router.full_update_period))
+            if self.router.max_update_period is not None:
+                config_values.append(("Max Update Period", self.router.max_update_period))
+            if self.router.query_port is not None:
+                config_values.append(("Query Port", self.router.query_port))
+            if self.router.prefixes:
+                config_values.append(("Prefixes", ", ".join(self.router.prefixes)))
+            if self.router.summary_prefixes:
+                config_values.append(("Summary Prefixes", ", ".join(self.router.summary_prefixes)))
+            if self.router.hold_down is not None:
+                config_values.append(("Hold-down", self.router.hold_down))
+            if self.router.count_to_infinity_threshold is not None:
+                config_values.append(("Count to Infinity Threshold", self.router.count_to_infinity_threshold))
+            if self.router.hello_interval is not None:
+                config_values.append(("Hello Interval", self.router.hello_interval))
+                config_values.append(("Hello Multiplier", self.router.hello_multiplier))
+            if self.router.receive_buffer is not None:
+                config_values.append(("Receive Buffer", self.router.receive_buffer))
+            if self.router.send_buffer is not None:
+                config_values.append(("Send Buffer", self.router.send_buffer))
+            if self.router.send_pacing is not None:
+                config_values.append(("Send Pacing", self.router.send_pacing))
         values += "\n".join([title + ": " + str(value) for title, value in config_values])
         values += "\n" + "-" * 40
         return values
@@ -118,6 +204,141 @@ class Loader:
         self.router.update_period = self.validate_update_period(parts[1].strip())
         self.process_timeouts()
 
+    def process_full_update_period(self, line):
+        """ Set the full routing table update period for the router, enabling delta periodic updates in between. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid full-update-period: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No full-update-period given")
+        self.router.full_update_period = self.validate_positive_integer(parts[1].strip(), "full-update-period")
+
+    def process_max_update_period(self, line):
+        """ Set the longest the router's update period may stretch to while its routes are stable, enabling it. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid max-update-period: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No max-update-period given")
+        max_update_period = self.validate_positive_integer(parts[1].strip(), "max-update-period")
+        if max_update_period > self.MAX_ADVERTISED_UPDATE_PERIOD:
+            raise ValueError(
+                "Invalid max-update-period: '" + str(max_update_period) + "', more than " +
+                str(self.MAX_ADVERTISED_UPDATE_PERIOD)
+            )
+        self.router.max_update_period = max_update_period
+
+    def process_query_port(self, line):
+        """ Set the port of the router's local query service, enabling it. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid query-port: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No query-port given")
+        self.router.query_port = self.validate_port(parts[1].strip())
+
+    def process_prefixes(self, line):
+        """ Set the prefixes the router originates (advertises routes to). """
+        parts = " ".join(line.split(" ")[1:]).split(",")  # Remove 'prefixes' and split on commas.
+        if not any(parts):
+            raise ValueError("No prefixes given")
+        for prefix in parts:
+            prefix = self.validate_prefix(prefix)
+            if prefix not in self.router.prefixes:
+                self.router.prefixes.append(prefix)
+
+    def process_summary_prefixes(self, line):
+        """ Set the prefixes the router advertises in place of the more specific prefixes they contain. """
+        parts = " ".join(line.split(" ")[1:]).split(",")  # Remove 'summary-prefixes' and split on commas.
+        if not any(parts):
+            raise ValueError("No summary-prefixes given")
+        for prefix in parts:
+            prefix = self.validate_prefix(prefix)
+            if prefix not in self.router.summary_prefixes:
+                self.router.summary_prefixes.append(prefix)
+
+    def process_hold_down(self, line):
+        """ Set how long in seconds the router ignores worse routes to a destination after poisoning its route. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid hold-down: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No hold-down given")
+        self.router.hold_down = self.validate_positive_integer(parts[1].strip(), "hold-down")
+
+    def process_count_to_infinity_threshold(self, line):
+        """ Set how many times in a row a route's cost may rise through the same neighbours before it is poisoned. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid count-to-infinity-threshold: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No count-to-infinity-threshold given")
+        threshold = self.validate_positive_integer(parts[1].strip(), "count-to-infinity-threshold")
+        if threshold < 2:
+            raise ValueError("Invalid count-to-infinity-threshold: '" + str(threshold) + "', must be at least 2")
+        self.router.count_to_infinity_threshold = threshold
+
+    def process_hello_interval(self, line):
+        """ Set how often in seconds the router sends hellos to its neighbours, enabling neighbour liveness probes. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid hello-interval: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No hello-interval given")
+        hello_interval = parts[1].strip()
+        try:
+            hello_interval = float(hello_interval)
+        except ValueError:
+            raise ValueError("Invalid hello-interval: '" + hello_interval + "', not a number")
+        if not self.MIN_HELLO_INTERVAL <= hello_interval <= self.MAX_HELLO_INTERVAL:
+            raise ValueError(
+                "Invalid hello-interval: '" + parts[1] + "', not in range {}-{}".format(
+                    self.MIN_HELLO_INTERVAL, self.MAX_HELLO_INTERVAL
+                )
+            )
+        self.router.hello_interval = hello_interval
+
+    def process_hello_multiplier(self, line):
+        """ Set how many of the router's hellos in a row its neighbours may miss before they consider it down. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid hello-multiplier: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No hello-multiplier given")
+        hello_multiplier = self.validate_positive_integer(parts[1].strip(), "hello-multiplier")
+        if hello_multiplier > self.MAX_HELLO_MULTIPLIER:
+            raise ValueError(
+                "Invalid hello-multiplier: '" + str(hello_multiplier) + "', more than " + str(self.MAX_HELLO_MULTIPLIER)
+            )
+        self.router.hello_multiplier = hello_multiplier
+
+    def process_receive_buffer(self, line):
+        """ Set the size in bytes of the router's input socket receive buffers (SO_RCVBUF). """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid receive-buffer: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No receive-buffer given")
+        self.router.receive_buffer = self.validate_positive_integer(parts[1].strip(), "receive-buffer")
+
+    def process_send_buffer(self, line):
+        """ Set the size in bytes of the router's output socket send buffer (SO_SNDBUF). """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid send-buffer: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No send-buffer given")
+        self.router.send_buffer = self.validate_positive_integer(parts[1].strip(), "send-buffer")
+
+    def process_send_pacing(self, line):
+        """ Set how many milliseconds apart the router sends packets to each neighbour, enabling send pacing. """
+        parts = line.split(" ")
+        if len(parts) > 2:
+            raise ValueError("Invalid send-pacing: '" + " ".join(parts[1:]) + "', too many arguments")
+        elif len(parts) < 2:
+            raise ValueError("No send-pacing given")
+        self.router.send_pacing = self.validate_positive_integer(parts[1].strip(), "send-pacing")
+
     def process_timeouts(self):
         self.router.timeout_length = self.router.update_period * self.TIMEOUT_UPDATE_RATIO
         deletion_after_timeout = self.router.update_period * self.DELETION_UPDATE_RATIO
@@ -150,6 +371,11 @@ class Loader:
 
         return port
 
+    @staticmethod
+    def validate_prefix(prefix):
+        """ Validate an IPv4 prefix in CIDR notation, such as 10.1.0.0/16. """
+        return format_prefix(*parse_prefix(prefix))
+
     def validate_cost(self, cost):
         """ Validate a router cost. """
         cost = cost.strip()
@@ -165,6 +391,15 @@ class Loader:
 
         return cost
 
+    @staticmethod
+    def validate_positive_integer(value, setting):
+        """ Validate the value of a setting that must be a positive integer. """
+        value = value.strip()
+        if not value.isdigit() or int(value) == 0:
+            raise ValueError("Invalid " + setting + ": '" + value + "', not a positive integer")
+
+        return int(value)
+
     @staticmethod
     def validate_update_period(update_period):
         """ Validate a router update_period. """
@@ -0,0 +1,227 @@
+"""
+A router's forwarding table (destination, first hop and cost of each route), published to a memory-mapped file so that
+other processes on the host can look up routes without parsing anything or asking the router.
+
+File layout, in native byte order:
+    Header       magic (4 bytes), version (uint8), flags (uint8), router id (uint16), capacity (uint32),
+                 count (uint32), sequence (uint64)
+    Destinations capacity int32s, the first 'count' of which are sorted.
+    First hops   capacity uint16s, in the same order as the destinations.
+    Costs        capacity uint16s, in the same order as the destinations.
+
+The sequence is a seqlock: the writer makes it odd while it writes and even again once done, so a reader that sees the
+same even sequence before and after a lookup knows the lookup was consistent. When the table outgrows the file's
+capacity, the writer publishes to a new, larger file in its place, and flags the old file as replaced so that readers
+reopen it. A new writer, such as a restarted router's, flags the file left by the last one the same way.
+"""
+
+import array
+import bisect
+import mmap
+import os
+import struct
+
+
+class ForwardingTable:
+    MAGIC = b"RIPF"
+    VERSION = 1
+    HEADER_FORMAT = "=4sBBHIIQ"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    FLAGS_OFFSET = 5
+    COUNT_OFFSET = 12
+    SEQUENCE_OFFSET = 16
+    FLAG_REPLACED = 1
+    MIN_CAPACITY = 64
+
+    @classmethod
+    def get_size(cls, capacity):
+        return cls.HEADER_SIZE + capacity * (4 + 2 + 2)
+
+    @classmethod
+    def get_offsets(cls, capacity):
+        """ Get the offsets of the destinations, first hops and costs arrays, for a given capacity. """
+        destinations_offset = cls.HEADER_SIZE
+        first_hops_offset = destinations_offset + capacity * 4
+        costs_offset = first_hops_offset + capacity * 2
+        return destinations_offset, first_hops_offset, costs_offset
+
+
+class ForwardingTableWriter:
+    """ Publishes a router's forwarding table to a memory-mapped file. Only one writer may use a file at a time. """
+    def __init__(self, filename, router_id):
+        self.filename = filename
+        self.router_id = router_id
+        self.sequence = 0
+        self.file = None
+        self.map = None
+        self.capacity = 0
+        self.publish([])
+
+    def create(self, capacity):
+        """ Create and map a new, empty file of the given capacity, to take the place of the current one. """
+        new_file = open(self.filename + ".new", "w+b")
+        new_file.write(struct.pack(
+            ForwardingTable.HEADER_FORMAT, ForwardingTable.MAGIC, ForwardingTable.VERSION, 0, self.router_id,
+            capacity, 0, self.sequence
+        ))
+        new_file.truncate(ForwardingTable.get_size(capacity))
+        new_file.flush()
+        self.file = new_file
+        self.map = mmap.mmap(new_file.fileno(), 0)
+        self.capacity = capacity
+
+    def map_previous(self):
+        """
+        Map the file left by an earlier writer, such as the router before it restarted, so that readers still using it
+        can be told it has been replaced. Return its (file, map), or (None, None) if there is no such file.
+        """
+        try:
+            previous_file = open(self.filename, "r+b")
+        except OSError:
+            return None, None
+        if os.fstat(previous_file.fileno()).st_size < ForwardingTable.HEADER_SIZE:
+            previous_file.close()
+            return None, None
+        previous_map = mmap.mmap(previous_file.fileno(), 0)
+        if struct.unpack_from(ForwardingTable.HEADER_FORMAT, previous_map)[0] != ForwardingTable.MAGIC:
+            previous_map.close()
+            previous_file.close()
+            return None, None
+        return previous_file, previous_map
+
+    def publish(self, routes):
+        """ Publish a forwarding table, given as (destination, first hop, cost) tuples. """
+        routes = sorted(routes)
+        # If the table has outgrown the file, fill a larger file before putting it in place of the current one, so
+        # that readers never see an empty table.
+        created = self.map is None or len(routes) > self.capacity
+        replaced_file, replaced_map = self.file, self.map
+        if self.map is None:
+            replaced_file, replaced_map = self.map_previous()
+        if created:
+            capacity = max(self.capacity, ForwardingTable.MIN_CAPACITY)
+            while capacity < len(routes):
+                capacity *= 2
+            self.create(capacity)
+
+        destinations_offset, first_hops_offset, costs_offset = ForwardingTable.get_offsets(self.capacity)
+        destinations = array.array("i", (route[0] for route in routes)).tobytes()
+        first_hops = array.array("H", (route[1] for route in routes)).tobytes()
+        costs = array.array("H", (route[2] for route in routes)).tobytes()
+
+        # Make the sequence odd while writing, so readers know to retry.
+        self.sequence += 1
+        struct.pack_into("=Q", self.map, ForwardingTable.SEQUENCE_OFFSET, self.sequence)
+        self.map[destinations_offset:destinations_offset + len(destinations)] = destinations
+        self.map[first_hops_offset:first_hops_offset + len(first_hops)] = first_hops
+        self.map[costs_offset:costs_offset + len(costs)] = costs
+        struct.pack_into("=I", self.map, ForwardingTable.COUNT_OFFSET, len(routes))
+        self.sequence += 1
+        struct.pack_into("=Q", self.map, ForwardingTable.SEQUENCE_OFFSET, self.sequence)
+
+        if created:
+            os.replace(self.filename + ".new", self.filename)
+        if created and replaced_map is not None:
+            replaced_map[ForwardingTable.FLAGS_OFFSET] = ForwardingTable.FLAG_REPLACED
+            replaced_map.close()
+            replaced_file.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class ForwardingTableReader:
+    """ Looks up routes in a forwarding table published by a router, without locking or copying the table. """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.map = None
+        self.view = None
+        self.destinations = None
+        self.first_hops = None
+        self.costs = None
+        self.router_id = None
+        self.open()
+
+    def open(self):
+        if self.map is not None:
+            self.close()
+        self.file = open(self.filename, "rb")
+        # An empty file cannot be mapped, so check the size of the file before mapping it.
+        if os.fstat(self.file.fileno()).st_size < ForwardingTable.HEADER_SIZE:
+            self.file.close()
+            raise ValueError("Forwarding table too short for its header: " + self.filename)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.router_id, capacity, _, _ = struct.unpack_from(ForwardingTable.HEADER_FORMAT, self.map)
+        if magic != ForwardingTable.MAGIC or version != ForwardingTable.VERSION:
+            self.close()
+            raise ValueError("Not a version " + str(ForwardingTable.VERSION) + " forwarding table: " + self.filename)
+        if len(self.map) < ForwardingTable.get_size(capacity):
+            self.close()
+            raise ValueError("Forwarding table too short for its capacity: " + self.filename)
+        # Views straight onto the mapped file, nothing is copied.
+        destinations_offset, first_hops_offset, costs_offset = ForwardingTable.get_offsets(capacity)
+        self.view = memoryview(self.map)
+        self.destinations = self.view[destinations_offset:first_hops_offset].cast("i")
+        self.first_hops = self.view[first_hops_offset:costs_offset].cast("H")
+        self.costs = self.view[costs_offset:costs_offset + capacity * 2].cast("H")
+
+    def read_sequence(self):
+        """ Wait for the writer to finish any write in progress. Return the sequence, and the number of routes. """
+        while True:
+            if self.map[ForwardingTable.FLAGS_OFFSET] & ForwardingTable.FLAG_REPLACED:
+                self.open()
+            sequence, = struct.unpack_from("=Q", self.map, ForwardingTable.SEQUENCE_OFFSET)
+            if not sequence & 1:
+                count, = struct.unpack_from("=I", self.map, ForwardingTable.COUNT_OFFSET)
+                return sequence, count
+
+    def is_consistent(self, sequence):
+        """ Check that the table has not been written since the given sequence was read. """
+        return struct.unpack_from("=Q", self.map, ForwardingTable.SEQUENCE_OFFSET)[0] == sequence
+
+    @property
+    def generation(self):
+        """ Number of times the table has been published to the file. """
+        return self.read_sequence()[0] // 2
+
+    def find(self, destination, count):
+        index = bisect.bisect_left(self.destinations, destination, 0, count)
+        if index < count and self.destinations[index] == destination:
+            return self.first_hops[index], self.costs[index]
+        return None
+
+    def lookup(self, destination):
+        """ Get the (first hop, cost) of the route to a destination, or None if there is no route. """
+        while True:
+            sequence, count = self.read_sequence()
+            route = self.find(destination, count)
+            if self.is_consistent(sequence):
+                return route
+
+    def lookup_many(self, destinations):
+        """ Look up the routes to several destinations, all from the same version of the table. """
+        while True:
+            sequence, count = self.read_sequence()
+            routes = [self.find(destination, count) for destination in destinations]
+            if self.is_consistent(sequence):
+                return routes
+
+    def get_table(self):
+        """ Get a copy of the whole table, as a map of destinations to (first hop, cost) pairs. """
+        while True:
+            sequence, count = self.read_sequence()
+            table = dict(zip(self.destinations[:count].tolist(), zip(self.first_hops[:count], self.costs[:count])))
+            if self.is_consistent(sequence):
+                return table
+
+    def close(self):
+        # The views only exist once the file has been checked, so there may be none to release.
+        for view in (self.destinations, self.first_hops, self.costs, self.view):
+            if view is not None:
+                view.release()
+        self.destinations = self.first_hops = self.costs = self.view = None
+        self.map.close()
+        self.file.close()
+        self.map = None
@@ -1,6 +1,9 @@
+import array
 import struct
 from socket import *
 
+from prefix_trie import format_prefix, is_prefix, mask_to_length, length_to_mask, parse_prefix
+
 
 class Packet:
 
@@ -40,10 +43,14 @@ class Packet:
 
         return struct.pack(self.byte_format, *values)
 
-    def send(self, port, pack):
-        """ Send a packed version of this packet to a port on localhost """
+    def send(self, port, pack, a_socket=None):
+        """ Send a packed version of this packet to a port on localhost, from a_socket if given, else a new socket """
+        if a_socket is not None:
+            a_socket.sendto(pack, ("localhost", port))
+            return
         a_socket = socket(AF_INET, SOCK_DGRAM)
         a_socket.sendto(pack, ("localhost", port))
+        a_socket.close()
 
     def format_field(self, _format, len_bytes, name=None):
         """ Add a field to the packet format """
@@ -60,20 +67,44 @@ class Packet:
         """ Add a signed char field (8-bit) to the packet format """
         self.format_field("b", 1, name)
 
+    def format_uint8(self, name):
+        """ Add an unsigned char field (8-bit) to the packet format """
+        self.format_field("B", 1, name)
+
     def format_int16(self, name):
         """ Add a short field (16-bit) to the packet format """
         self.format_field("h", 2, name)
 
+    def format_uint16(self, name):
+        """ Add an unsigned short field (16-bit) to the packet format """
+        self.format_field("H", 2, name)
+
     def format_int32(self, name):
         """ Add an int field (32-bit) to the packet format """
         self.format_field("i", 4, name)
 
+    def format_uint32(self, name):
+        """ Add an unsigned int field (32-bit) to the packet format """
+        self.format_field("I", 4, name)
+
 
 class RIPPacket(Packet):
 
     RIP_VERSION = 2
     RIP_COMMAND = 2  # RIP Command: 2 is 'response'
+    RIP_COMMAND_REQUEST = 1  # RIP Command: 1 is 'request'
     AF_INET = 2
+    AF_UNSPECIFIED = 0  # Address family of the single entry of a request for the whole routing table.
+    INFINITY = 16
+    MAX_ENTRIES = 25  # Most entries a packet may carry, including the router info entry, to fit in a 512 byte datagram.
+    # Address family of the optional router info entry, which leads a packet's entries when present, in the same way
+    # RFC 2453 puts authentication in a leading entry with address family 0xFFFF.
+    AF_ROUTER_INFO = 0xFFFE
+
+    NO_TRACE = (0, 0)  # Trace (origin router id, sequence number) of entries whose route change is not being traced.
+
+    # Router info flags.
+    FLAG_DELTA = 1  # The packet only carries routes changed since the last update, all others are unchanged.
 
     def __init__(self, byte_data=None):
         """ Initialize RIP packet header fields, optionally unpack byte_data """
@@ -82,7 +113,16 @@ class RIPPacket(Packet):
         self.command = None
         self.version = None
         self.from_router_id = None
+        self.flags = 0
+        self.update_period = 0  # Seconds until the sender's next periodic update, if it advertises it.
         self.entries = []
+        # Arrays of each field of the unpacked entries, in entry order. Entry dicts are only made from them if needed.
+        self.afis = None
+        self.addresses = None
+        self.masks = None
+        self.costs = None
+        self.trace_origins = None
+        self.trace_sequences = None
         self.num_entries = 0
         self.entry_size = 20  # Size in bytes of a RIP entry
         self.header_size = 4  # Size in bytes of RIP header
@@ -95,20 +135,103 @@ class RIPPacket(Packet):
         if byte_data:
             self.unpack(byte_data)
 
-    def add_entry(self, router_id, cost):
-        """ Add a RIP entry to this packet """
+    @property
+    def entries(self):
+        """
+        The packet's entries, as dicts. Those of an unpacked packet are made from its entry arrays when first used
+        """
+        if self._entries is None:
+            self._entries = [
+                {
+                    "afi": afi,
+                    "router_id": address,
+                    "mask": mask,
+                    "cost": cost,
+                    "destination": address if not mask else format_prefix(address, mask_to_length(mask)),
+                    "trace": (trace_origin, trace_sequence),
+                }
+                for afi, address, mask, cost, trace_origin, trace_sequence in zip(
+                    self.afis, self.addresses, self.masks, self.costs, self.trace_origins, self.trace_sequences
+                )
+            ]
+        return self._entries
+
+    @entries.setter
+    def entries(self, entries):
+        self._entries = entries
+
+    def get_destinations(self):
+        """ Get the destination of each unpacked entry, a router id, or a prefix in CIDR notation if it has a mask """
+        if self.masks.count(0) == len(self.masks):
+            return self.addresses.tolist()
+        return [
+            address if not mask else format_prefix(address, mask_to_length(mask))
+            for address, mask in zip(self.addresses, self.masks)
+        ]
+
+    def add_entry(self, router_id, cost, mask=0, trace=NO_TRACE):
+        """
+        Add a RIP entry to this packet. A mask of 0 makes the address a router id, rather than a prefix. The trace is
+        the (origin router id, sequence number) of the route change the entry carries, if it is being traced
+        """
         self.entries.append({
             "afi": self.AF_INET,
             "router_id": router_id,
+            "mask": mask,
             "cost": cost,
+            "destination": router_id if not mask else format_prefix(router_id, mask_to_length(mask)),
+            "trace": trace,
         })
 
+    def add_destination(self, destination, cost, trace=NO_TRACE):
+        """ Add a RIP entry for a routing table destination, either a router id or a prefix, to this packet """
+        if is_prefix(destination):
+            address, length = parse_prefix(destination)
+            self.add_entry(address, cost, length_to_mask(length), trace)
+        else:
+            self.add_entry(destination, cost, trace=trace)
+
+    def get_traces(self):
+        """ Get the (origin router id, sequence number) trace of each unpacked entry """
+        return list(zip(self.trace_origins, self.trace_sequences))
+
+    def request_whole_table(self):
+        """ Make this packet a request for the receiver's whole routing table """
+        self.command = self.RIP_COMMAND_REQUEST
+        self.entries = [{
+            "afi": self.AF_UNSPECIFIED,
+            "router_id": 0,
+            "mask": 0,
+            "cost": self.INFINITY,
+            "destination": 0,
+            "trace": self.NO_TRACE,
+        }]
+
+    def is_request(self):
+        return self.command == self.RIP_COMMAND_REQUEST
+
+    def is_whole_table_request(self):
+        """ Check if this packet is a request for the whole routing table, a single entry with no address family """
+        return self.is_request() and len(self.entries) == 1 and \
+            self.entries[0]["afi"] == self.AF_UNSPECIFIED and self.entries[0]["cost"] == self.INFINITY
+
+    def format_router_info(self):
+        """ Add the router info entry to the packet format """
+        self.format_uint16("info_afi")
+        self.format_uint16("flags")
+        self.format_uint16("update_period")
+        self.format_padding(14)
+
     def format_entry(self):
-        """ Add a RIP entry to the packet format """
-        self.format_int16("afi_" + str(self.num_entries))
-        self.format_padding(2)
-        self.format_int32("router_id_" + str(self.num_entries))
-        self.format_padding(8)
+        """
+        Add a RIP entry to the packet format. The address field holds the router id of router id entries. The route tag
+        and next hop fields of RFC 2453 hold the origin router id and sequence number of a traced route change
+        """
+        self.format_uint16("afi_" + str(self.num_entries))
+        self.format_uint16("trace_origin_" + str(self.num_entries))
+        self.format_uint32("router_id_" + str(self.num_entries))
+        self.format_uint32("mask_" + str(self.num_entries))
+        self.format_uint32("trace_sequence_" + str(self.num_entries))
         self.format_int32("cost_" + str(self.num_entries))
 
     def validate(self):
@@ -119,15 +242,25 @@ class RIPPacket(Packet):
         if self.version != self.RIP_VERSION:
             return False
 
-        if self.command != self.RIP_COMMAND:
+        if self.command not in (self.RIP_COMMAND, self.RIP_COMMAND_REQUEST):
             return False
 
-        for entry in self.entries:
-            if entry['afi'] != self.AF_INET:
-                return False
+        if self.is_whole_table_request():
+            return True
+
+        # Check each field of every entry at once, using the entry arrays
+        if self.afis.count(self.AF_INET) != len(self.afis):
+            return False
+
+        # Prefixes must have a contiguous mask, and no address bits set beyond it
+        if self.masks.count(0) != len(self.masks):
+            for address, mask in zip(self.addresses, self.masks):
+                if mask and (mask_to_length(mask) is None or address & ~mask):
+                    return False
 
-            if not (1 <= entry['cost'] <= 16):
-                return False
+        # The metrics of requested routes are ignored
+        if not self.is_request() and self.costs and not (1 <= min(self.costs) and max(self.costs) <= self.INFINITY):
+            return False
 
         return True
 
@@ -136,27 +269,43 @@ class RIPPacket(Packet):
 
         # Calculate number of expected entries in this byte_data
         entries = (len(byte_data) - self.header_size) // self.entry_size
-
-        # Add entries to the packet format for unpacking
-        while self.num_entries < entries:
-            self.format_entry()
-            self.num_entries += 1
-
-        # Do the unpacking!
-        super().unpack(byte_data)
-
-        # Populate self.entries from unpacked entry values
-        for i in range(self.num_entries):
-            i = str(i)
-            self.entries.append({
-                "afi": getattr(self, "afi_" + i),
-                "router_id": getattr(self, "router_id_" + i),
-                "cost": getattr(self, "cost_" + i),
-            })
+        entries_offset = self.header_size
+
+        # Add the router info entry to the packet format for unpacking, if it leads the entries
+        if entries and struct.unpack_from("H", byte_data, self.header_size)[0] == self.AF_ROUTER_INFO:
+            self.format_router_info()
+            entries -= 1
+            entries_offset += self.entry_size
+
+        if len(byte_data) != entries_offset + entries * self.entry_size:
+            raise struct.error(
+                "unpack requires a buffer of {} bytes".format(entries_offset + entries * self.entry_size)
+            )
+
+        # Unpack the header and router info
+        super().unpack(byte_data[:entries_offset])
+
+        # Unpack every entry at once, into an array of each field. An entry is five 32-bit words: the address family
+        # and trace origin (half words), the address, the mask, the trace sequence number, then the cost.
+        entry_bytes = byte_data[entries_offset:]
+        words = array.array("I", entry_bytes)
+        half_words = array.array("H", entry_bytes)
+        self.afis = half_words[::self.entry_size // 2]
+        self.trace_origins = half_words[1::self.entry_size // 2]
+        self.addresses = words[1::5]
+        self.masks = words[2::5]
+        self.trace_sequences = words[3::5]
+        self.costs = array.array("i", entry_bytes)[4::5]
+        self.entries = None
 
     def pack(self, values=False):
         """ Format RIP packet values and pack into byte string """
 
+        # Add the router info entry to packet format, ahead of other entries, if there is any info to send
+        has_router_info = bool(self.flags or self.update_period)
+        if has_router_info and "info_afi" not in self.field_names:
+            self.format_router_info()
+
         # Add entries to packet format
         entries = len(self.entries)
         while self.num_entries < entries:
@@ -165,18 +314,83 @@ class RIPPacket(Packet):
 
         # Add header values if not explicitly set
         if not values:
-            values = [self.RIP_COMMAND, self.RIP_VERSION, self.from_router_id]
+            values = [self.command or self.RIP_COMMAND, self.RIP_VERSION, self.from_router_id]
+
+        # Append router info values to list for packing
+        if has_router_info:
+            values += [self.AF_ROUTER_INFO, self.flags, self.update_period]
 
         # Append RIP entry values to list for packing
         for entry in self.entries:
             values.append(entry["afi"])
+            values.append(entry["trace"][0])
             values.append(entry["router_id"])
+            values.append(entry["mask"])
+            values.append(entry["trace"][1])
             values.append(entry["cost"])
 
         # Do the packing!
         return super().pack(values)
 
-    def send(self, port, from_router_id):
+    def send(self, port, from_router_id, a_socket=None):
         """ Send the RIP packet from this router_id to localhost:port """
         setattr(self, "from_router_id", from_router_id)
-        return super().send(port, self.pack())
+        return super().send(port, self.pack(), a_socket)
+
+
+class HelloPacket(Packet):
+    """
+    Tiny liveness probe sent to neighbours between routing updates, in the style of BFD (RFC 5880). It advertises how
+    often the sender sends hellos, and how many in a row may be missed before it is considered down. A hello with an
+    interval of 0 is an "admin down" hello, sent when the sender stops sending hellos while staying up.
+    """
+    HELLO_COMMAND = 6  # Not a RIP command. RFC 2453 only defines commands 1 and 2, with 3 to 5 obsolete or reserved.
+    HELLO_VERSION = 1
+    ADMIN_DOWN_INTERVAL = 0
+    SIZE = 8
+
+    def __init__(self, byte_data=None):
+        """ Initialize hello packet fields, optionally unpack byte_data """
+        super().__init__()
+
+        self.command = self.HELLO_COMMAND
+        self.version = self.HELLO_VERSION
+        self.from_router_id = None
+        self.interval = 0  # Milliseconds between the sender's hellos.
+        self.multiplier = 0  # Number of the sender's hellos in a row that may be missed.
+
+        self.format_int8("command")
+        self.format_int8("version")
+        self.format_int16("from_router_id")
+        self.format_uint16("interval")
+        self.format_uint8("multiplier")
+        self.format_padding(1)
+
+        if byte_data:
+            self.unpack(byte_data)
+
+    @classmethod
+    def is_hello(cls, byte_data):
+        """ Check if a datagram is a hello, rather than a RIP packet """
+        return len(byte_data) == cls.SIZE and byte_data[0] == cls.HELLO_COMMAND
+
+    def validate(self):
+        """ Validate known fields for incoming hello packets """
+        return self.unpacked and self.version == self.HELLO_VERSION and (self.is_admin_down() or self.multiplier > 0)
+
+    def is_admin_down(self):
+        """ Check if the sender is stopping its hellos, rather than going down """
+        return self.interval == self.ADMIN_DOWN_INTERVAL
+
+    def get_detect_time(self):
+        """ Get how long in seconds the sender may go without a hello before it is considered down """
+        return self.interval * self.multiplier / 1000
+
+    def pack(self, values=False):
+        """ Pack hello packet values into byte string """
+        return super().pack([self.command, self.version, self.from_router_id, self.interval, self.multiplier])
+
+    def send(self, port, from_router_id, a_socket=None):
+        """ Send the hello packet from this router_id to localhost:port """
+        setattr(self, "from_router_id", from_router_id)
+        return super().send(port, self.pack(), a_socket)
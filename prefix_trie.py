@@ -0,0 +1,211 @@
+"""
+IPv4 prefixes, and a compressed binary radix trie for longest prefix match lookups of them.
+
+Prefixes are written in CIDR notation ("10.1.0.0/16"), and handled as (address, length) pairs, where the address is
+an unsigned 32-bit integer with no bits set beyond the prefix length. A length of 0 is not a valid prefix, as a mask of
+0 marks a RIP entry as a router id rather than a prefix.
+"""
+
+ADDRESS_BITS = 32
+MAX_ADDRESS = (1 << ADDRESS_BITS) - 1
+
+
+def length_to_mask(length):
+    return (MAX_ADDRESS << (ADDRESS_BITS - length)) & MAX_ADDRESS
+
+
+def mask_to_length(mask):
+    """ Get the prefix length of a mask, or None if the mask's bits are not contiguous. """
+    length = ADDRESS_BITS - (~mask & MAX_ADDRESS).bit_length()
+    return length if length_to_mask(length) == mask else None
+
+
+def parse_address(text):
+    """ Parse a dotted decimal IPv4 address to an integer. """
+    parts = text.strip().split(".")
+    if len(parts) != 4 or not all(part.isdigit() and int(part) <= 255 for part in parts):
+        raise ValueError("Invalid address: '" + text.strip() + "', usage: a.b.c.d")
+    return (int(parts[0]) << 24) | (int(parts[1]) << 16) | (int(parts[2]) << 8) | int(parts[3])
+
+
+def format_address(address):
+    return "{}.{}.{}.{}".format(address >> 24, (address >> 16) & 255, (address >> 8) & 255, address & 255)
+
+
+def parse_prefix(text):
+    """ Parse a prefix in CIDR notation to an (address, length) pair. """
+    parts = text.strip().split("/")
+    if len(parts) != 2 or not parts[1].isdigit():
+        raise ValueError("Invalid prefix: '" + text.strip() + "', usage: a.b.c.d/length")
+    address = parse_address(parts[0])
+    length = int(parts[1])
+    if not 1 <= length <= ADDRESS_BITS:
+        raise ValueError("Invalid prefix: '" + text.strip() + "', length not in range 1-" + str(ADDRESS_BITS))
+    if address & ~length_to_mask(length) & MAX_ADDRESS:
+        raise ValueError("Invalid prefix: '" + text.strip() + "', address has bits set beyond the prefix length")
+    return address, length
+
+
+def format_prefix(address, length):
+    return format_address(address) + "/" + str(length)
+
+
+def is_prefix(destination):
+    """ Check if a routing table destination is a prefix, rather than a router id. """
+    return isinstance(destination, str)
+
+
+def get_destination_sort_key(destination):
+    """ Sort key for routing table destinations, putting router ids first, then prefixes in address order. """
+    if is_prefix(destination):
+        return (1,) + parse_prefix(destination)
+    return 0, destination, 0
+
+
+class PrefixTrieNode:
+    __slots__ = ("address", "length", "value", "children")
+
+    EMPTY = object()  # Value of nodes that only branch, and do not hold a prefix.
+
+    def __init__(self, address, length, value=EMPTY):
+        self.address = address
+        self.length = length
+        self.value = value
+        self.children = [None, None]
+
+
+class PrefixTrie:
+    """
+    Maps prefixes to values, with longest prefix match lookups of addresses. A path compressed binary trie: each node
+    skips straight to the next bit that distinguishes its children, so a lookup visits at most one node per prefix
+    length that could match, rather than one per bit.
+    """
+    def __init__(self):
+        self.root = PrefixTrieNode(0, 0)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def get_bit(address, index):
+        """ Get the bit of an address at an index, counting from the most significant bit. """
+        return (address >> (ADDRESS_BITS - 1 - index)) & 1
+
+    @staticmethod
+    def get_common_length(address_a, address_b):
+        """ Get the length of the longest prefix two addresses have in common. """
+        return ADDRESS_BITS - (address_a ^ address_b).bit_length()
+
+    def insert(self, address, length, value):
+        """ Add a prefix, or replace its value if already present. """
+        address &= length_to_mask(length)
+        node = self.root
+        while node.length < length:
+            bit = (address >> (ADDRESS_BITS - 1 - node.length)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = PrefixTrieNode(address, length, value)
+                self.size += 1
+                return
+            if child.length <= length and not (address ^ child.address) >> (ADDRESS_BITS - child.length):
+                node = child
+                continue
+            # The new prefix diverges from the child's part way along the child's compressed path, so split the path.
+            # New nodes are complete before being linked in, so concurrent lookups never see a partial node.
+            common_length = min(child.length, length, self.get_common_length(child.address, address))
+            if common_length == length:
+                new_node = PrefixTrieNode(address, length, value)
+            else:
+                new_node = PrefixTrieNode(address & length_to_mask(common_length), common_length)
+                new_node.children[self.get_bit(address, common_length)] = PrefixTrieNode(address, length, value)
+            new_node.children[self.get_bit(child.address, common_length)] = child
+            node.children[bit] = new_node
+            self.size += 1
+            return
+        if node.value is PrefixTrieNode.EMPTY:
+            self.size += 1
+        node.value = value
+
+    def find_path(self, address, length):
+        """ Get the nodes from the root down to an exact prefix, or None if the prefix is not in the trie. """
+        path = [self.root]
+        node = self.root
+        while node.length < length:
+            node = node.children[(address >> (ADDRESS_BITS - 1 - node.length)) & 1]
+            if node is None or node.length > length:
+                return None
+            path.append(node)
+        return path if node.address == address else None
+
+    def remove(self, address, length):
+        """ Remove a prefix. Return its value, or None if it was not present. """
+        path = self.find_path(address & length_to_mask(length), length)
+        if path is None or path[-1].value is PrefixTrieNode.EMPTY:
+            return None
+        node = path.pop()
+        value = node.value
+        node.value = PrefixTrieNode.EMPTY
+        self.size -= 1
+        # Remove nodes that no longer hold a prefix or branch, so that paths stay compressed.
+        while path and node.value is PrefixTrieNode.EMPTY:
+            left, right = node.children
+            if left is not None and right is not None:
+                break
+            parent = path.pop()
+            parent.children[self.get_bit(node.address, parent.length)] = left if left is not None else right
+            node = parent
+        return value
+
+    def get(self, address, length, default=None):
+        """ Get the value of an exact prefix. """
+        path = self.find_path(address & length_to_mask(length), length)
+        if path is None or path[-1].value is PrefixTrieNode.EMPTY:
+            return default
+        return path[-1].value
+
+    def lookup(self, address, default=None):
+        """ Get the value of the longest prefix matching an address. """
+        best = default
+        node = self.root
+        empty = PrefixTrieNode.EMPTY
+        while node is not None:
+            length = node.length
+            if (address ^ node.address) >> (ADDRESS_BITS - length):
+                break
+            if node.value is not empty:
+                best = node.value
+            if length == ADDRESS_BITS:
+                break
+            node = node.children[(address >> (ADDRESS_BITS - 1 - length)) & 1]
+        return best
+
+    def lookup_many(self, addresses, default=None):
+        """ Get the values of the longest prefixes matching each of several addresses. """
+        # The lookup loop is repeated here rather than calling lookup, to save a call per address.
+        results = []
+        root = self.root
+        empty = PrefixTrieNode.EMPTY
+        for address in addresses:
+            best = default
+            node = root
+            while node is not None:
+                length = node.length
+                if (address ^ node.address) >> (ADDRESS_BITS - length):
+                    break
+                if node.value is not empty:
+                    best = node.value
+                if length == ADDRESS_BITS:
+                    break
+                node = node.children[(address >> (ADDRESS_BITS - 1 - length)) & 1]
+            results.append(best)
+        return results
+
+    def items(self):
+        """ Get ((address, length), value) pairs for every prefix, in address order. """
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.value is not PrefixTrieNode.EMPTY:
+                yield (node.address, node.length), node.value
+            stack += [child for child in reversed(node.children) if child is not None]
@@ -0,0 +1,91 @@
+import json
+import socketserver
+import threading
+import time
+
+
+class RoutingTableSnapshot:
+    """
+    An immutable copy of a router's routing table and neighbour status. The protocol loop publishes a new snapshot
+    whenever the routing table changes, rather than modifying one in place, so queries never need a lock.
+    """
+    def __init__(self, generation, routes, neighbours):
+        self.generation = generation
+        self.published = time.time()
+        self.routes = routes  # Map destinations (as strings) to (first hop, cost, timer) tuples.
+        self.neighbours = neighbours  # Map neighbour ids to dictionaries of neighbour status.
+
+
+class QueryHandler(socketserver.BaseRequestHandler):
+    """
+    Answers newline separated queries on a connection, in order. Queries may be pipelined, every query received in the
+    same read is answered with a single write. Bytes that are not valid UTF-8 are replaced, and the connection is closed
+    if a query grows longer than the buffer size without a newline.
+
+    Queries:
+        route <destination> [<destination> ...]  One "<destination> <first-hop> <cost>" line per destination, or
+                                                 "<destination> none" if there is no route.
+        table                                    The whole routing table, as a line of JSON.
+        neighbours                               The status of every neighbour, as a line of JSON.
+    """
+    BUFFER_SIZE = 65536
+
+    def handle(self):
+        pending = b""
+        while True:
+            data = self.request.recv(self.BUFFER_SIZE)
+            if not data:
+                break
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            # Answer every query in this read from the same snapshot.
+            snapshot = self.server.snapshot
+            self.request.sendall(
+                b"".join(self.answer(line.decode(errors="replace").split(), snapshot) for line in lines)
+            )
+            # Don't buffer without limit for a client that never ends its query.
+            if len(pending) > self.BUFFER_SIZE:
+                break
+
+    @staticmethod
+    def answer(parts, snapshot):
+        if not parts:
+            return b""
+        if parts[0] == "route":
+            answer = ""
+            for destination in parts[1:]:
+                route = snapshot.routes.get(destination)
+                answer += destination + (" {} {}\n".format(route[0], route[1]) if route else " none\n")
+            return answer.encode()
+        elif parts[0] == "table":
+            table = {
+                destination: {"first-hop": first_hop, "cost": cost, "timer": timer}
+                for destination, (first_hop, cost, timer) in snapshot.routes.items()
+            }
+            return (json.dumps({"generation": snapshot.generation, "routes": table}) + "\n").encode()
+        elif parts[0] == "neighbours":
+            neighbours = {
+                neighbour_id: dict(status, **{
+                    "last-heard": round(time.time() - status["last-heard"], 3) if status["last-heard"] else None
+                })
+                for neighbour_id, status in snapshot.neighbours.items()
+            }
+            return (json.dumps({"generation": snapshot.generation, "neighbours": neighbours}) + "\n").encode()
+        return ("error unknown query '" + parts[0] + "'\n").encode()
+
+
+class QueryServer(socketserver.ThreadingTCPServer):
+    """ Local read-only query service for a router's routing table, served from published snapshots. """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port):
+        super().__init__(("localhost", port), QueryHandler)
+        self.snapshot = RoutingTableSnapshot(0, {}, {})
+
+    def publish(self, snapshot):
+        """ Replace the snapshot queries are answered from. Replacing a reference is atomic, so needs no lock. """
+        self.snapshot = snapshot
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
@@ -2,18 +2,28 @@ import json
 import random
 import time
 from datetime import datetime
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from packet import *
 from select import select
+import signal
 import sys
 import os
 
-from config_loader import Loader
+from capture import CaptureWriter
+from config_loader import Loader, Config
+from forwarding_table import ForwardingTableWriter
+from prefix_trie import PrefixTrie, get_destination_sort_key, is_prefix, length_to_mask, parse_address, parse_prefix
+from query_server import QueryServer, RoutingTableSnapshot
 
 
 class Router:
     INFINITY = 16
     READ_TIMEOUT = 1  # How long in seconds a router should wait for sockets to be ready to be read from.
+    # Most datagrams read from a socket each time it is ready, so that a flood of them cannot hold up the main loop.
+    MAX_READS = 256
+    ORIGINATED_COST = 1  # Cost this router advertises for the prefixes it originates.
+    # Update periods a route's cost may go without rising before its rises no longer count as counting to infinity.
+    RISING_UPDATE_PERIODS = 2
 
     def __init__(self, config_lines):
         self.id = None
@@ -22,24 +32,102 @@ class Router:
         self.update_period = None
         self.timeout_length = None
         self.deletion_length = None
+        self.full_update_period = None  # Periodic updates only carry changed routes in between full updates, if set.
+        self.max_update_period = None  # The update period stretches up to this while routes are stable, if set.
+        self.query_port = None  # Port of the local query service, which is only run if set.
+        self.prefixes = []  # Prefixes this router originates, in CIDR notation.
+        self.summary_prefixes = []  # Prefixes to advertise in place of the more specific prefixes they contain.
+        # Seconds worse routes to a destination are ignored for after its route is poisoned, if set.
+        self.hold_down = None
+        # Number of times in a row a route's cost may rise through the same neighbours before it is poisoned, if set.
+        self.count_to_infinity_threshold = None
+        self.hello_interval = None  # Seconds between hellos sent to neighbours, to detect failures quickly, if set.
+        self.hello_multiplier = None  # Number of this router's hellos in a row neighbours may miss, if sending hellos.
+        self.receive_buffer = None  # Size in bytes of the input sockets' receive buffers, the default if not set.
+        self.send_buffer = None  # Size in bytes of the output socket's send buffer, the default if not set.
+        self.send_pacing = None  # Milliseconds between packets sent to the same neighbour, if set.
 
         # Assign all above variables.
         self.config_loader = Loader(config_lines, self)
         self.config_loader.load()
 
         self.input_sockets = {}
+        self.output_socket = None  # Socket every packet is sent from, once opened. Otherwise each uses a new socket.
+        # Map neighbour ids to queues of (RIP packet, periodic) waiting to be sent to them, while sends are paced.
+        self.send_queues = {}
+        self.time_of_next_send = {}  # Map neighbour ids to the monotonic time the next packet may be sent to them.
+        self.socket_drops = {}  # Map input ports to the number of datagrams the kernel had dropped when last checked.
+        # Map destinations, router ids or prefixes (CIDR notation strings), to routes.
         self.routing_table = {}
+        self.first_hop_routes = {}  # Reverse index of the routing table. Map first hop ids to sets of destination ids.
+        # Longest prefix match index of originated prefixes and reachable prefix routes. Map prefixes to themselves.
+        self.prefix_trie = PrefixTrie()
+        for prefix in self.prefixes:
+            self.update_prefix_trie(prefix)
+        # Map summary prefixes to the sets of originated or routed prefixes they contain, and those back to summaries.
+        self.summary_components = {}
+        self.component_summaries = {}
+        self.summary_routes = {}  # Map summary prefixes in use to their (cost, first hop) when last advertised.
+        self.index_summaries()
 
-        self.time_of_last_update = int(time.time())
+        self.time_of_last_update = int(time.time())  # Randomly offset, to avoid synchronised updates.
+        # Seconds between periodic updates, stretched from the update period while routes are stable, if enabled.
+        self.current_update_period = self.update_period
+        self.routes_changed = False  # Whether any route has changed since the last periodic update.
+        self.time_of_last_timing_update = int(time.time())
+        self.time_of_last_full_update = time.time()
         self.triggered_updates = []  # List of destination router ids.
+        # Map destinations no longer originated or summarized to the time they are garbage collected. Until then, they
+        # are advertised at infinity in every update, like deleted routes in RFC 2453.
+        self.withdrawn_routes = {}
+        # Map neighbour ids to maps of destination router ids to the costs last sent to them.
+        self.advertised_costs = {}
+        self.full_update_neighbours = set()  # Neighbour ids owed a full update at the next periodic update.
+        # Map neighbour ids to maps of destination router ids to the costs of the routes through them, from their most
+        # recent advertisements. Used to fail over to alternate routes without waiting for the next periodic update.
+        self.received_costs = {}
+        self.neighbour_last_heard = {}  # Map neighbour ids to the time a packet was last received from them.
+        # Map neighbour ids sending hellos to the monotonic time their last hello was received, and to how long they
+        # may go without one before they are considered down.
+        self.neighbour_last_hello = {}
+        self.neighbour_detect_times = {}
+        self.time_of_last_hello = 0  # Monotonic time hellos were last sent.
+        # Map neighbour ids to the seconds until their next periodic update, as they last advertised.
+        self.neighbour_update_periods = {}
+        # Map destinations in hold-down to (time it ends, cost of the route before it was poisoned).
+        self.hold_downs = {}
+        # Map destinations whose route cost is rising to [cost before rising, number of increases, set of first hops,
+        # time of the last increase].
+        self.rising_routes = {}
+        # Route changes are tagged with the (origin router id, sequence number) of the change that caused them, if
+        # tracing. Sequence numbers start from the time in milliseconds, so that they are not reused after a restart.
+        self.tracing = False
+        self.trace_sequence = int(time.time() * 1000) % 2 ** 32
+        self.route_traces = {}  # Map destinations to the trace of the last change to their route.
+        self.current_trace = RIPPacket.NO_TRACE  # Trace of the packet entry being processed.
+        # Map (neighbour id, destination) pairs to the traces last received from or sent to that neighbour.
+        self.received_traces = {}
+        self.sent_traces = {}
 
         self.load = False
         self.verbose = False
         self.config_dir = None
+        self.config_filename = None
+        self.reload_requested = False
+        self.shutdown_requested = False
+        self.logging_enabled = True
+        self.dry_run = False  # Whether to build packets without sending them, such as when replaying a capture.
+        self.capture_writer = None
+        self.event_log_file = None
+        self.query_server = None
+        self.forwarding_table_writer = None
+        self.snapshot_generation = 0
 
         self.log("Router created!\n" + self.config_loader.get_pretty_config_values())
 
     def log(self, *args):
+        if not self.logging_enabled:
+            return
         message = " ".join(map(str, args))
         date_time_prefix = "<" + str(datetime.now()).split(".")[0] + "> "
         message = ("\n" + " " * len(date_time_prefix)).join(message.split("\n"))
@@ -47,6 +135,138 @@ class Router:
         with open("./logs/log-" + str(self.id) + ".txt", "a+") as log_file:
             log_file.write(date_time_prefix + message + "\n\n")
 
+    def start_event_log(self):
+        """ Record structured events, one JSON object per line, to this router's event log. """
+        os.makedirs(os.path.dirname("./logs/"), exist_ok=True)
+        event_log_filename = "./logs/events-" + str(self.id) + ".jsonl"
+        self.event_log_file = open(event_log_filename, "a")
+        self.log("Recording events to", event_log_filename)
+
+    def log_event(self, event, **fields):
+        """
+        Record an event to the event log, if it is enabled. Times are monotonic clock times, which are shared by all
+        routers running on the same machine.
+        """
+        if self.event_log_file is None:
+            return
+        record = {"time": time.monotonic(), "router": self.id, "event": event}
+        record.update(fields)
+        self.event_log_file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def start_tracing(self):
+        """ Tag route changes, so that their propagation from router to router can be traced in the event logs. """
+        if self.event_log_file is None:
+            self.start_event_log()
+        self.tracing = True
+        self.log("Tracing route changes")
+
+    def trace_route_change(self, destination, cost, first_hop):
+        """
+        Tag a change to the route to a destination with the trace of the packet entry that caused it, or start a new
+        trace from this router if it was not caused by a traced entry.
+        """
+        trace = self.current_trace
+        if trace == RIPPacket.NO_TRACE:
+            self.trace_sequence = (self.trace_sequence + 1) % 2 ** 32
+            trace = (self.id, self.trace_sequence)
+        self.route_traces[destination] = trace
+        self.log_event(
+            "trace-change", origin=trace[0], sequence=trace[1], dest=destination, cost=cost, first_hop=first_hop
+        )
+
+    def receive_traces(self, rip_packet, input_router_id, update_costs):
+        """
+        Log the traced route changes carried by a neighbour's update for the first time, and get the traces of its
+        entries by destination.
+        """
+        traces = {}
+        for destination, update_cost, trace in zip(
+            rip_packet.get_destinations(), update_costs, rip_packet.get_traces()
+        ):
+            if trace == RIPPacket.NO_TRACE:
+                continue
+            traces[destination] = trace
+            if self.received_traces.get((input_router_id, destination)) != trace:
+                self.received_traces[(input_router_id, destination)] = trace
+                self.log_event(
+                    "trace-receive", origin=trace[0], sequence=trace[1], dest=destination, neighbour=input_router_id,
+                    cost=update_cost
+                )
+        return traces
+
+    def log_sent_traces(self, rip_packet, neighbour_id, periodic):
+        """ Log the traced route changes sent to a neighbour for the first time. """
+        for entry in rip_packet.entries:
+            trace = entry["trace"]
+            key = (neighbour_id, entry["destination"])
+            if trace != RIPPacket.NO_TRACE and self.sent_traces.get(key) != trace:
+                self.sent_traces[key] = trace
+                self.log_event(
+                    "trace-send", origin=trace[0], sequence=trace[1], dest=entry["destination"], neighbour=neighbour_id,
+                    cost=entry["cost"], periodic=periodic
+                )
+
+    def start_capture(self):
+        """ Record every received datagram to this router's capture file. """
+        os.makedirs(os.path.dirname("./captures/"), exist_ok=True)
+        capture_filename = "./captures/capture-" + str(self.id) + ".bin"
+        self.capture_writer = CaptureWriter(capture_filename, self.id)
+        self.log("Capturing received packets to", capture_filename)
+
+    def start_query_server(self):
+        """ Serve read-only queries of the routing table on the query port, from a separate thread. """
+        try:
+            self.query_server = QueryServer(self.query_port)
+        except OSError:
+            print("Could not bind query service to port " + str(self.query_port) + ".")
+            self.log("Could not bind query service to port", self.query_port)
+            return
+        self.publish_routing_table()
+        self.query_server.start()
+        self.log("Serving routing table queries on port", self.query_port)
+
+    def start_forwarding_table(self):
+        """ Publish the routing table to this router's memory-mapped forwarding table file, for other processes. """
+        os.makedirs(os.path.dirname("./router-memory/"), exist_ok=True)
+        forwarding_table_filename = "./router-memory/forwarding-table-" + str(self.id) + ".bin"
+        self.forwarding_table_writer = ForwardingTableWriter(forwarding_table_filename, self.id)
+        self.publish_routing_table()
+        self.log("Publishing forwarding table to", forwarding_table_filename)
+
+    def publish_routing_table(self):
+        """
+        Publish the routing table to the forwarding table file, and a snapshot of the routing table and neighbour
+        status to the query service, where they are in use. Each snapshot is a new copy, so queries being answered from
+        the previous one are unaffected.
+        """
+        if self.forwarding_table_writer is not None:
+            # The forwarding table file only holds routes to router ids.
+            self.forwarding_table_writer.publish(
+                (router_id, route_info[RouteInfos.FIRST_HOP], route_info[RouteInfos.COST])
+                for router_id, route_info in self.routing_table.items() if not is_prefix(router_id)
+            )
+        if self.query_server is None:
+            return
+        self.snapshot_generation += 1
+        routes = {
+            str(router_id): (
+                route_info[RouteInfos.FIRST_HOP], route_info[RouteInfos.COST], route_info[RouteInfos.TIMER]
+            )
+            for router_id, route_info in self.routing_table.items()
+        }
+        neighbours = {}
+        for neighbour_id, (port, cost) in self.outputs.items():
+            route_info = self.routing_table.get(neighbour_id)
+            neighbours[neighbour_id] = {
+                "port": port,
+                "link-cost": cost,
+                "first-hop": route_info[RouteInfos.FIRST_HOP] if route_info else None,
+                "cost": route_info[RouteInfos.COST] if route_info else self.INFINITY,
+                "reachable": route_info is not None and route_info[RouteInfos.COST] != self.INFINITY,
+                "last-heard": self.neighbour_last_heard.get(neighbour_id)
+            }
+        self.query_server.publish(RoutingTableSnapshot(self.snapshot_generation, routes, neighbours))
+
     def check_if_converged(self):
         """ Check to see if the routing table has converged to the expected routing table, if one exists. """
         if os.path.isdir(self.config_dir + "/converged-routing-tables"):
@@ -71,32 +291,289 @@ class Router:
     def bind_input_sockets(self):
         """ Bind sockets to input ports. """
         for input_port in self.input_ports:
-            a_socket = socket(AF_INET, SOCK_DGRAM)
-            try:
-                a_socket.bind(("localhost", input_port))
-                self.log("Bound input socket to port", input_port)
-            except OSError:
-                print("Could not bind socket to port " + str(input_port) + ". A socket is already bound to this port.")
-                self.log("Could not bind input socket to port", input_port)
+            if not self.bind_input_socket(input_port):
                 exit(12)
-            self.input_sockets[input_port] = a_socket
+
+    def bind_input_socket(self, input_port):
+        """ Bind a socket to a single input port. Return whether the socket could be bound. """
+        a_socket = socket(AF_INET, SOCK_DGRAM)
+        try:
+            a_socket.bind(("localhost", input_port))
+            self.log("Bound input socket to port", input_port)
+            # Non-blocking, so that datagrams can be read until none are left, rather than one per select.
+            a_socket.setblocking(False)
+            if self.receive_buffer is not None:
+                self.set_socket_buffer(a_socket, SO_RCVBUF, self.receive_buffer)
+        except OSError:
+            print("Could not bind socket to port " + str(input_port) + ". A socket is already bound to this port.")
+            self.log("Could not bind input socket to port", input_port)
+            a_socket.close()
+            return False
+        self.input_sockets[input_port] = a_socket
+        return True
+
+    def open_output_socket(self):
+        """ Open the socket every packet is sent from. """
+        self.output_socket = socket(AF_INET, SOCK_DGRAM)
+        if self.send_buffer is not None:
+            self.set_socket_buffer(self.output_socket, SO_SNDBUF, self.send_buffer)
+
+    def set_socket_buffer(self, a_socket, option, size):
+        """
+        Set the size of a socket's receive (SO_RCVBUF) or send (SO_SNDBUF) buffer. The system may cap it, or double it
+        to allow for bookkeeping, so the size actually set is logged.
+        """
+        try:
+            a_socket.setsockopt(SOL_SOCKET, option, size)
+        except OSError as error:
+            self.log("Could not set socket buffer size to", size, "bytes\n" + str(error))
+            return
+        self.log(
+            "Set", "receive" if option == SO_RCVBUF else "send", "buffer of socket", a_socket.getsockname(), "to",
+            a_socket.getsockopt(SOL_SOCKET, option), "bytes"
+        )
+
+    def check_socket_drops(self):
+        """ Log any datagrams the kernel has dropped since they were last checked, for want of input buffer space. """
+        drops = read_udp_drops()
+        if drops is None:
+            return
+        for input_port in self.input_ports:
+            total_drops = drops.get(input_port, 0)
+            new_drops = total_drops - self.socket_drops.get(input_port, 0)
+            self.socket_drops[input_port] = total_drops
+            if new_drops > 0:
+                self.log("Kernel dropped", new_drops, "datagrams received on port", input_port, "for want of space")
+                self.log_event("socket-drops", port=input_port, drops=new_drops, total=total_drops)
+
+    def request_reload(self, *_):
+        """ Signal handler, flag the config file to be reloaded by the main loop. """
+        self.reload_requested = True
+
+    def request_shutdown(self, *_):
+        """ Signal handler, flag the router to be shut down by the main loop. """
+        self.shutdown_requested = True
+
+    def shut_down(self):
+        """
+        Shut down cleanly, advertising every route through this router, and the route to this router itself, at
+        infinity to all neighbours first, so that the network reconverges straight away rather than waiting for them to
+        time out. Then save the routing table and close every file and socket.
+        """
+        self.log("Shutting down, withdrawing all routes from neighbours")
+        destinations = self.get_advertised_destinations() + [self.id]
+        if self.tracing:
+            for destination in destinations:
+                self.trace_route_change(destination, self.INFINITY, None)
+        # Routes still queued to be sent are about to be withdrawn anyway.
+        self.send_queues = {}
+        try:
+            self.send_updates(destinations, withdraw=True)
+            self.flush_send_queues()
+        except OSError as error:
+            self.log("Could not withdraw routes from neighbours\n" + str(error))
+        self.save_routing_table()
+
+        for input_socket in self.input_sockets.values():
+            input_socket.close()
+        self.input_sockets = {}
+        if self.output_socket:
+            self.output_socket.close()
+        if self.query_server:
+            self.query_server.shutdown()
+            self.query_server.server_close()
+        if self.forwarding_table_writer:
+            self.forwarding_table_writer.close()
+        if self.capture_writer:
+            self.capture_writer.close()
+        self.log_event("shutdown")
+        if self.event_log_file:
+            self.event_log_file.close()
+            self.event_log_file = None
+        self.log("Router shut down")
+
+    def reload_config(self):
+        """ Reload the config file, applying changed input ports, outputs and update period without restarting. """
+        self.reload_requested = False
+        self.log("Reloading configuration from", self.config_filename)
+        config = Config()
+        try:
+            with open(self.config_filename) as config_file:
+                Loader(config_file.readlines(), config).load(exit_on_error=False)
+        except (OSError, ValueError) as error:
+            print("Could not reload configuration:", error)
+            self.log("Could not reload configuration\n" + str(error))
+            return
+        if config.id != self.id:
+            print("Could not reload configuration: router-id cannot be changed while running")
+            self.log("Could not reload configuration, router-id changed from", self.id, "to", config.id)
+            return
+
+        # Only rebind the input sockets whose ports have changed.
+        for input_port in set(self.input_ports) - set(config.input_ports):
+            self.input_sockets.pop(input_port).close()
+            self.log("Closed input socket on port", input_port)
+        for input_port in set(config.input_ports) - set(self.input_ports):
+            self.bind_input_socket(input_port)
+        self.input_ports = [port for port in config.input_ports if port in self.input_sockets]
+
+        # Adjust the routes affected by removed, added or re-costed neighbours.
+        affected_router_ids = set()
+        for neighbour_id in set(self.outputs) - set(config.outputs):
+            self.log("Neighbour", neighbour_id, "removed from configuration")
+            self.outputs.pop(neighbour_id)
+            self.neighbour_last_heard.pop(neighbour_id, None)
+            self.neighbour_update_periods.pop(neighbour_id, None)
+            self.neighbour_last_hello.pop(neighbour_id, None)
+            self.neighbour_detect_times.pop(neighbour_id, None)
+            affected_router_ids.update(self.poison_routes_via(neighbour_id))
+        for neighbour_id, (port, cost) in config.outputs.items():
+            old_port, old_cost = self.outputs.get(neighbour_id, (None, None))
+            self.outputs[neighbour_id] = (port, cost)
+            if old_cost is not None and old_cost != cost:
+                self.log("Cost of link to neighbour", neighbour_id, "changed from", old_cost, "to", cost)
+                for router_id, received_cost in self.received_costs.get(neighbour_id, {}).items():
+                    self.received_costs[neighbour_id][router_id] = min(received_cost - old_cost + cost, self.INFINITY)
+                for router_id in list(self.first_hop_routes.get(neighbour_id, ())):
+                    route_info = self.routing_table[router_id]
+                    if route_info[RouteInfos.COST] == self.INFINITY:
+                        continue
+                    new_cost = min(route_info[RouteInfos.COST] - old_cost + cost, self.INFINITY)
+                    self.update_routing_table_entry(
+                        router_id, cost=new_cost, timer=self.timeout_length if new_cost == self.INFINITY else None
+                    )
+                    affected_router_ids.add(router_id)
+            elif old_cost is None:
+                self.log("Neighbour", neighbour_id, "added to configuration")
+                self.send_requests([neighbour_id])
+            # A new or re-costed direct link may now be the best route to the neighbour.
+            if old_cost == cost:
+                continue
+            if neighbour_id not in self.routing_table or cost < self.routing_table[neighbour_id][RouteInfos.COST]:
+                self.update_routing_table_entry(neighbour_id, neighbour_id, cost, 0)
+                affected_router_ids.add(neighbour_id)
+
+        for neighbour_id in set(self.advertised_costs) - set(self.outputs):
+            self.advertised_costs.pop(neighbour_id)
+        if config.full_update_period != self.full_update_period:
+            self.log("Full update period changed from", self.full_update_period, "to", config.full_update_period)
+            self.full_update_period = config.full_update_period
+            self.advertised_costs = {}
+
+        # Advertise newly originated prefixes, and withdraw those no longer originated.
+        for prefix in set(self.prefixes) - set(config.prefixes):
+            self.log("Prefix", prefix, "no longer originated")
+            self.withdraw_route(prefix)
+            affected_router_ids.add(prefix)
+            if self.tracing:
+                self.trace_route_change(prefix, self.INFINITY, None)
+        for prefix in set(config.prefixes) - set(self.prefixes):
+            self.log("Prefix", prefix, "now originated")
+            self.withdrawn_routes.pop(prefix, None)
+            if prefix in self.routing_table:
+                self.remove_routing_table_entry(prefix)
+            affected_router_ids.add(prefix)
+            if self.tracing:
+                self.trace_route_change(prefix, self.ORIGINATED_COST, self.id)
+        old_prefixes = self.prefixes
+        self.prefixes = config.prefixes
+        for prefix in set(old_prefixes) ^ set(self.prefixes):
+            self.update_prefix_trie(prefix)
+
+        # Re-summarize every prefix if the summary prefixes have changed, withdrawing summaries no longer in use.
+        if config.summary_prefixes != self.summary_prefixes or set(old_prefixes) != set(self.prefixes):
+            for summary in set(self.summary_prefixes) - set(config.summary_prefixes):
+                if self.summary_routes.pop(summary, None):
+                    self.withdraw_route(summary)
+                    affected_router_ids.add(summary)
+            self.summary_prefixes = config.summary_prefixes
+            self.index_summaries()
+            affected_router_ids.update(self.prefixes)
+            affected_router_ids.update(router_id for router_id in self.routing_table if is_prefix(router_id))
+
+        if config.hold_down != self.hold_down:
+            self.log("Hold-down changed from", self.hold_down, "to", config.hold_down)
+            self.hold_down = config.hold_down
+        if config.count_to_infinity_threshold != self.count_to_infinity_threshold:
+            self.log(
+                "Count to infinity threshold changed from", self.count_to_infinity_threshold,
+                "to", config.count_to_infinity_threshold
+            )
+            self.count_to_infinity_threshold = config.count_to_infinity_threshold
+            self.rising_routes = {}
+
+        if config.hello_interval != self.hello_interval or config.hello_multiplier != self.hello_multiplier:
+            self.log(
+                "Hello interval and multiplier changed from", self.hello_interval, "and", self.hello_multiplier,
+                "to", config.hello_interval, "and", config.hello_multiplier
+            )
+            # Tell neighbours hellos are stopping, otherwise they would consider this router down once they miss them.
+            if config.hello_interval is None and self.hello_interval is not None:
+                self.send_hellos(admin_down=True)
+            self.hello_interval = config.hello_interval
+            self.hello_multiplier = config.hello_multiplier
+
+        if config.receive_buffer != self.receive_buffer:
+            self.log("Receive buffer changed from", self.receive_buffer, "to", config.receive_buffer)
+            self.receive_buffer = config.receive_buffer
+            if self.receive_buffer is not None:
+                for input_socket in self.input_sockets.values():
+                    self.set_socket_buffer(input_socket, SO_RCVBUF, self.receive_buffer)
+        if config.send_buffer != self.send_buffer:
+            self.log("Send buffer changed from", self.send_buffer, "to", config.send_buffer)
+            self.send_buffer = config.send_buffer
+            if self.send_buffer is not None and self.output_socket is not None:
+                self.set_socket_buffer(self.output_socket, SO_SNDBUF, self.send_buffer)
+        if config.send_pacing != self.send_pacing:
+            self.log("Send pacing changed from", self.send_pacing, "to", config.send_pacing)
+            self.send_pacing = config.send_pacing
+            if self.send_pacing is None:
+                self.flush_send_queues()
+
+        if config.query_port != self.query_port:
+            self.log("Query port cannot be changed while running, still using", self.query_port)
+
+        # Start again from the base update period if either period has changed.
+        if config.update_period != self.update_period or config.max_update_period != self.max_update_period:
+            self.current_update_period = config.update_period
+        if config.update_period != self.update_period:
+            self.log("Update period changed from", self.update_period, "to", config.update_period)
+            self.update_period = config.update_period
+            self.timeout_length = config.timeout_length
+            self.deletion_length = config.deletion_length
+        if config.max_update_period != self.max_update_period:
+            self.log("Max update period changed from", self.max_update_period, "to", config.max_update_period)
+            self.max_update_period = config.max_update_period
+
+        self.log("Configuration reloaded\n" + self.config_loader.get_pretty_config_values())
+        if affected_router_ids:
+            self.log("Flagging routes to", ", ".join(map(str, affected_router_ids)), "for triggered update")
+            self.triggered_updates += affected_router_ids
+        self.save_routing_table()
+        self.publish_routing_table()
 
     def initialise_routing_table(self):
         """  Initialise the router's routing table. """
         os.makedirs(os.path.dirname("./router-memory/"), exist_ok=True)
 
         # Read the last config directory opened, clear router memory if this is a different config.
+        # Routers of the same config are often started at once, so other routers may be clearing memory too.
+        config_dir_changed = True
         if os.path.isfile("./router-memory/last-config-dir"):
             with open("./router-memory/last-config-dir", 'r+') as last_config_dir:
-                if self.config_dir != last_config_dir.readline():
-                    [
-                        os.remove(os.path.join("./router-memory/", f))
-                        for f in os.listdir("./router-memory/") if f.endswith(".json")
-                    ]
+                config_dir_changed = self.config_dir != last_config_dir.readline()
+                if config_dir_changed:
+                    for f in os.listdir("./router-memory/"):
+                        if f.endswith(".json"):
+                            try:
+                                os.remove(os.path.join("./router-memory/", f))
+                            except FileNotFoundError:
+                                pass
 
-        # Write current config dir to router-memory
-        with open("./router-memory/last-config-dir", 'w') as new_config_dir:
-            new_config_dir.write(self.config_dir)
+        # Write current config dir to router-memory, only if it has changed, as writing truncates it for other routers.
+        if config_dir_changed:
+            with open("./router-memory/last-config-dir", 'w') as new_config_dir:
+                new_config_dir.write(self.config_dir)
 
         with open("./router-memory/routing-table-" + str(self.id) + ".json", "a+") as routing_table_file:
             routing_table_file.seek(0)
@@ -113,12 +590,14 @@ class Router:
                     routing_table_file,
                     object_hook=object_hook
                 )
+                self.index_routing_table()
                 self.log("Routing table loaded from memory")
             else:
                 self.log("Initialsing routing table")
                 for router_id in self.outputs:
                     self.update_routing_table_entry(router_id, router_id, self.outputs[router_id][1], 0)
         self.save_routing_table()
+        self.publish_routing_table()
 
     def save_routing_table(self):
         """ Save this router's routing table to memory. """
@@ -130,28 +609,215 @@ class Router:
     def get_string_routing_table(self):
         """ Print this router's routing table, in a table format. """
         table = ""
-        row_format = "{:" + str(len("Destination")) + "} | {:" + str(len("First hop")) + "} {:" + str(len("Cost")) + \
-                     "} {:" + str(len("Timer")) + "}"
-        table += row_format.format("Destination", "First hop", "Cost", "Timer")
-        for dest_id, route_info in sorted(self.routing_table.items(), key=lambda x: x[0]):
+        destination_width = max([len("Destination")] + [len(str(dest_id)) for dest_id in self.routing_table])
+        row_format = "{:>" + str(destination_width) + "} | {:" + str(len("First hop")) + "} {:" + str(len("Cost")) + \
+                     "} {:" + str(len("Timer")) + "} {}"
+        table += row_format.format("Destination", "First hop", "Cost", "Timer", "Equal cost first hops")
+        for dest_id, route_info in sorted(self.routing_table.items(), key=lambda x: get_destination_sort_key(x[0])):
+            equal_cost_first_hops = self.get_equal_cost_first_hops(dest_id)
             table += "\n" + row_format.format(
-                dest_id, route_info[RouteInfos.FIRST_HOP], route_info[RouteInfos.COST], route_info[RouteInfos.TIMER]
+                dest_id, route_info[RouteInfos.FIRST_HOP], route_info[RouteInfos.COST], route_info[RouteInfos.TIMER],
+                ", ".join(map(str, equal_cost_first_hops)) if len(equal_cost_first_hops) > 1 else ""
             )
         return table
 
+    def index_routing_table(self):
+        """ Rebuild the first hop reverse index from the routing table. """
+        self.first_hop_routes = {}
+        for router_id, route_info in self.routing_table.items():
+            self.first_hop_routes.setdefault(route_info[RouteInfos.FIRST_HOP], set()).add(router_id)
+        self.prefix_trie = PrefixTrie()
+        for prefix in self.prefixes + [router_id for router_id in self.routing_table if is_prefix(router_id)]:
+            self.update_prefix_trie(prefix)
+        self.index_summaries()
+
+    def index_summaries(self):
+        """ Rebuild the maps between summary prefixes and the originated or routed prefixes they contain. """
+        self.summary_components = {summary: set() for summary in self.summary_prefixes}
+        self.component_summaries = {}
+        for summary in set(self.summary_routes) - set(self.summary_prefixes):
+            self.summary_routes.pop(summary)
+        for prefix in self.prefixes + [router_id for router_id in self.routing_table if is_prefix(router_id)]:
+            self.update_summary_components(prefix)
+
+    def update_summary_components(self, prefix):
+        """ Add a prefix to the most specific summary prefix containing it, or remove it if no longer known. """
+        if not self.summary_prefixes:
+            return
+        summary = self.component_summaries.pop(prefix, None)
+        if summary is not None:
+            self.summary_components[summary].discard(prefix)
+        if prefix not in self.prefixes and prefix not in self.routing_table:
+            return
+        address, length = parse_prefix(prefix)
+        best_length = 0
+        for summary_prefix in self.summary_prefixes:
+            summary_address, summary_length = parse_prefix(summary_prefix)
+            if best_length < summary_length < length and address & length_to_mask(summary_length) == summary_address:
+                summary, best_length = summary_prefix, summary_length
+        if best_length:
+            self.summary_components[summary].add(prefix)
+            self.component_summaries[prefix] = summary
+
+    def get_summary_route(self, summary):
+        """
+        Get the (cost, first hop) of a summary prefix, the highest cost of its components, or None if it cannot be used.
+        A summary can only be used while every component is reachable through the same first hop. Otherwise it would
+        attract traffic for a component that cannot be delivered (a blackhole), or hide which way to send it.
+        """
+        components = self.summary_components.get(summary)
+        if not components:
+            return None
+        summary_first_hop = None
+        summary_cost = 0
+        for component in components:
+            if component in self.prefixes:
+                first_hop, cost = self.id, self.ORIGINATED_COST
+            else:
+                route_info = self.routing_table[component]
+                first_hop, cost = route_info[RouteInfos.FIRST_HOP], route_info[RouteInfos.COST]
+            if cost == self.INFINITY or (summary_first_hop is not None and first_hop != summary_first_hop):
+                return None
+            summary_first_hop = first_hop
+            summary_cost = max(summary_cost, cost)
+        return summary_cost, summary_first_hop
+
+    def summarize(self, destinations):
+        """
+        Replace destinations contained by a summary prefix with the summary, where the summary can be used. Where it
+        cannot, its components are advertised instead, and the summary is withdrawn if it was in use.
+        """
+        summarized_destinations = set()
+        summaries = set()
+        for destination in destinations:
+            summary = self.component_summaries.get(destination)
+            if summary is not None:
+                summaries.add(summary)
+            elif destination in self.summary_components:
+                summaries.add(destination)
+            else:
+                summarized_destinations.add(destination)
+        for summary in summaries:
+            summary_route = self.get_summary_route(summary)
+            if summary_route:
+                self.summary_routes[summary] = summary_route
+                self.withdrawn_routes.pop(summary, None)
+                summarized_destinations.add(summary)
+                continue
+            summarized_destinations.update(self.summary_components[summary])
+            if self.summary_routes.pop(summary, None):
+                self.log(
+                    "Withdrawing summary", summary, "as its components are not all reachable through one first hop"
+                )
+                self.withdraw_route(summary)
+                # Make sure every neighbour hears of the withdrawal, not just those this update is being sent to.
+                self.triggered_updates.append(summary)
+            if summary in self.withdrawn_routes:
+                summarized_destinations.add(summary)
+        return summarized_destinations
+
+    def update_prefix_trie(self, prefix):
+        """ Keep a prefix in the prefix trie only while it is originated or reachable, so lookups use the next best. """
+        address, length = parse_prefix(prefix)
+        route_info = self.routing_table.get(prefix)
+        if prefix in self.prefixes or (route_info and route_info[RouteInfos.COST] != self.INFINITY):
+            self.prefix_trie.insert(address, length, prefix)
+        else:
+            self.prefix_trie.remove(address, length)
+
+    def lookup_route(self, address):
+        """
+        Get the destination prefix of the route to an address (dotted decimal or an integer), by longest prefix match,
+        or None if there is no route. Routes to prefixes this router originates are not in the routing table.
+        """
+        return self.prefix_trie.lookup(parse_address(address) if isinstance(address, str) else address)
+
+    def lookup_routes(self, addresses):
+        """ Get the destination prefixes of the routes to several addresses, as with lookup_route. """
+        return self.prefix_trie.lookup_many(
+            [parse_address(address) if isinstance(address, str) else address for address in addresses]
+        )
+
+    def get_advertised_destinations(self):
+        """
+        Get every destination this router advertises, those in its routing table, the prefixes it originates and the
+        routes it has withdrawn.
+        """
+        return list(self.routing_table) + self.prefixes + [
+            destination for destination in self.withdrawn_routes if destination not in self.routing_table
+        ]
+
+    def withdraw_route(self, destination, collection_time=None):
+        """
+        Advertise a destination no longer originated or summarized at infinity until it is garbage collected (by
+        default, once the garbage collection period has passed), so that neighbours still hear of it if the triggered
+        update withdrawing it is lost.
+        """
+        if collection_time is None:
+            collection_time = time.time() + self.deletion_length - self.timeout_length
+        self.withdrawn_routes[destination] = collection_time
+
+    def collect_withdrawn_routes(self):
+        """
+        Stop advertising withdrawn routes whose garbage collection time has passed. In delta mode, they are kept until
+        a full update has carried them as well, as delta updates never send them again.
+        """
+        now = time.time()
+        for destination, collection_time in list(self.withdrawn_routes.items()):
+            if now < collection_time or (self.full_update_period and self.time_of_last_full_update < collection_time):
+                continue
+            self.log("Garbage collecting withdrawn route to", destination)
+            del self.withdrawn_routes[destination]
+            for advertised_costs in self.advertised_costs.values():
+                advertised_costs.pop(destination, None)
+
+    def get_advertised_route(self, destination):
+        """
+        Get the (cost, first hop) of the route this router advertises for a destination, or None if it has nothing to
+        advertise for it. Prefixes this router originates have itself as first hop, withdrawn routes have none.
+        """
+        if destination in self.summary_routes:
+            return self.summary_routes[destination]
+        if destination in self.routing_table:
+            route_info = self.routing_table[destination]
+            return route_info[RouteInfos.COST], route_info[RouteInfos.FIRST_HOP]
+        if destination in self.prefixes:
+            return self.ORIGINATED_COST, self.id
+        if destination in self.withdrawn_routes:
+            return self.INFINITY, None
+        return None
+
     def update_routing_table_entry(self, router_id, first_hop=None, cost=None, timer=None):
         """ Update or create a particular routing table entry, with given new values. """
         if router_id in self.routing_table:
             entry = self.routing_table[router_id]
             old_entry = entry.copy()
+            if first_hop is not None and first_hop != entry[RouteInfos.FIRST_HOP]:
+                self.first_hop_routes[entry[RouteInfos.FIRST_HOP]].discard(router_id)
+                self.first_hop_routes.setdefault(first_hop, set()).add(router_id)
             entry[RouteInfos.FIRST_HOP] = first_hop if first_hop is not None else entry[RouteInfos.FIRST_HOP]
             entry[RouteInfos.COST] = cost if cost is not None else entry[RouteInfos.COST]
             entry[RouteInfos.TIMER] = timer if timer is not None else entry[RouteInfos.TIMER]
             self.routing_table.update({router_id: entry})
+            if is_prefix(router_id) and entry[RouteInfos.COST] != old_entry[RouteInfos.COST]:
+                self.update_prefix_trie(router_id)
+            if entry[RouteInfos.COST] != old_entry[RouteInfos.COST] or \
+                    entry[RouteInfos.FIRST_HOP] != old_entry[RouteInfos.FIRST_HOP]:
+                self.log_event(
+                    "route", dest=router_id, old_cost=old_entry[RouteInfos.COST], cost=entry[RouteInfos.COST],
+                    old_first_hop=old_entry[RouteInfos.FIRST_HOP], first_hop=entry[RouteInfos.FIRST_HOP]
+                )
+                self.note_route_change()
+                if self.tracing:
+                    self.trace_route_change(router_id, entry[RouteInfos.COST], entry[RouteInfos.FIRST_HOP])
             self.log(
                 "Updated routing table entry for the route to",
                 str(router_id) + "\nOld:", str(old_entry) + "\nNew:", entry
             )
+            if self.count_to_infinity_threshold and entry[RouteInfos.COST] != old_entry[RouteInfos.COST]:
+                self.detect_count_to_infinity(
+                    router_id, old_entry[RouteInfos.COST], entry[RouteInfos.COST], entry[RouteInfos.FIRST_HOP]
+                )
         elif {first_hop, cost, timer} == {None}:
             raise ValueError(
                 "If a destination router id not already in the routing table is given, "
@@ -160,25 +826,216 @@ class Router:
         else:
             entry = RouteInfo(first_hop, cost, timer)
             self.routing_table.update({router_id: entry})
+            self.first_hop_routes.setdefault(first_hop, set()).add(router_id)
+            if is_prefix(router_id):
+                self.update_prefix_trie(router_id)
+                self.update_summary_components(router_id)
+            self.log_event(
+                "route", dest=router_id, old_cost=None, cost=cost, old_first_hop=None, first_hop=first_hop
+            )
+            self.note_route_change()
+            if self.tracing:
+                self.trace_route_change(router_id, cost, first_hop)
             self.log("Created new routing table entry for a route to", str(router_id) + "\nNew:", entry)
 
+    def remove_routing_table_entry(self, router_id):
+        """ Remove a particular routing table entry. """
+        route_info = self.routing_table.pop(router_id)
+        self.log_event("delete", dest=router_id, old_cost=route_info[RouteInfos.COST])
+        self.note_route_change()
+        self.route_traces.pop(router_id, None)
+        self.first_hop_routes[route_info[RouteInfos.FIRST_HOP]].discard(router_id)
+        if is_prefix(router_id):
+            self.update_prefix_trie(router_id)
+            self.update_summary_components(router_id)
+        for advertised_costs in self.advertised_costs.values():
+            advertised_costs.pop(router_id, None)
+
+    def note_route_change(self):
+        """ Record that a route has changed, putting the update period back to its base if it has been stretched. """
+        self.routes_changed = True
+        if self.current_update_period != self.update_period:
+            self.log("Routes changed, update period back to", self.update_period, "from", self.current_update_period)
+            self.current_update_period = self.update_period
+
+    def adapt_update_period(self):
+        """ Double the update period, up to the max update period, if no routes have changed since the last update. """
+        if self.max_update_period is not None and not self.routes_changed and \
+                self.current_update_period < self.max_update_period:
+            self.current_update_period = min(self.current_update_period * 2, self.max_update_period)
+            self.log("Routes stable, update period stretched to", self.current_update_period)
+        self.routes_changed = False
+
+    def get_timeout_length(self, first_hop):
+        """
+        Get how long routes through a first hop last without being refreshed. The timeout is scaled up for neighbours
+        that have advertised a longer update period than this router's, so their routes do not time out between
+        updates.
+        """
+        update_period = self.neighbour_update_periods.get(first_hop)
+        if update_period is None:
+            return self.timeout_length
+        return max(self.timeout_length, update_period * Loader.TIMEOUT_UPDATE_RATIO)
+
+    def poison_routes_via(self, first_hop):
+        """
+        Invalidate every reachable route through a first hop that is down, flagging them for a triggered update.
+        Return the destination router ids of the invalidated routes.
+        """
+        # The neighbour's advertisements can no longer be used as alternate routes.
+        self.received_costs.pop(first_hop, None)
+        self.log_event("neighbour-down", neighbour=first_hop)
+        poisoned_router_ids = [
+            router_id for router_id in self.first_hop_routes.get(first_hop, ())
+            if self.routing_table[router_id][RouteInfos.COST] != self.INFINITY
+        ]
+        if poisoned_router_ids:
+            self.log("Invalidating routes through", str(first_hop) + ":", ", ".join(map(str, poisoned_router_ids)))
+        for router_id in poisoned_router_ids:
+            self.invalidate_route(router_id)
+        return poisoned_router_ids
+
+    def get_alternate_costs(self, router_id, exclude=None):
+        """
+        Get (first hop, cost) pairs for the routes to a destination through each neighbour (other than an excluded one)
+        that is still alive, from their most recent advertisements.
+        """
+        now = time.time()
+        for neighbour_id, received_costs in self.received_costs.items():
+            if neighbour_id == exclude or \
+                    self.neighbour_last_heard.get(neighbour_id, 0) < now - self.get_timeout_length(neighbour_id):
+                continue
+            # A neighbour's direct link is a route to it, even though neighbours never advertise themselves.
+            cost = self.outputs[neighbour_id][1] if router_id == neighbour_id else received_costs.get(router_id)
+            if cost is not None and cost < self.INFINITY:
+                yield neighbour_id, cost
+
+    def find_alternate_route(self, router_id, exclude=None):
+        """ Find the best known route to a destination not through the excluded first hop. Return (first hop, cost). """
+        return min(self.get_alternate_costs(router_id, exclude), key=lambda x: x[1], default=None)
+
+    def get_equal_cost_first_hops(self, router_id):
+        """ Get the first hops of all known routes to a destination with the same cost as the route in use. """
+        route_info = self.routing_table[router_id]
+        return sorted(
+            neighbour_id for neighbour_id, cost in self.get_alternate_costs(router_id)
+            if cost == route_info[RouteInfos.COST]
+        )
+
+    def invalidate_route(self, router_id):
+        """
+        Switch a failed route to the best alternate route, if one is known, otherwise set its cost to infinity.
+        Either way, flag the route for a triggered update.
+        """
+        failed_first_hop = self.routing_table[router_id][RouteInfos.FIRST_HOP]
+        failed_cost = self.routing_table[router_id][RouteInfos.COST]
+        alternate_route = self.find_alternate_route(router_id, exclude=failed_first_hop)
+        if alternate_route and self.is_trusted_alternate(alternate_route, failed_cost):
+            first_hop, cost = alternate_route
+            self.log("Failing over route to", router_id, "from first hop", failed_first_hop, "to", first_hop)
+            self.update_routing_table_entry(router_id, first_hop=first_hop, cost=cost, timer=0)
+        else:
+            self.update_routing_table_entry(router_id, cost=self.INFINITY, timer=self.timeout_length)
+            self.start_hold_down(router_id, failed_cost)
+        self.triggered_updates.append(router_id)
+
+    def is_trusted_alternate(self, alternate_route, failed_cost):
+        """
+        Check if a poisoned route may fail over to an alternate route. In hold-down, only an alternate cheaper than the
+        failed route is trusted, as a costlier one may be a stale route that loops back through this router.
+        """
+        return not self.hold_down or alternate_route[1] < failed_cost
+
+    def start_hold_down(self, router_id, cost, length=None):
+        """
+        Hold down the route to a destination, if hold-down is enabled or a length is given: routes to it that cost as
+        much as the poisoned route did, or more, are ignored until the hold-down ends.
+        """
+        length = self.hold_down if length is None else length
+        if not length:
+            return
+        self.log("Holding down the route to", router_id, "for", length, "seconds")
+        self.hold_downs[router_id] = (time.time() + length, cost)
+        self.log_event("hold-down", dest=router_id, cost=cost, length=length)
+
+    def is_held_down(self, router_id, cost):
+        """ Check if a route to a destination at a given cost must be ignored, as the destination is in hold-down. """
+        hold_down = self.hold_downs.get(router_id)
+        return hold_down is not None and time.time() < hold_down[0] and cost >= hold_down[1]
+
+    def end_hold_downs(self):
+        """
+        End the hold-downs that have run their length. Routes still unreachable take the best alternate route now
+        known, rather than waiting for the next advertisement of one.
+        """
+        now = time.time()
+        for router_id, (end, _) in list(self.hold_downs.items()):
+            if now < end:
+                continue
+            del self.hold_downs[router_id]
+            route_info = self.routing_table.get(router_id)
+            if route_info is None or route_info[RouteInfos.COST] != self.INFINITY:
+                continue
+            alternate_route = self.find_alternate_route(router_id)
+            if alternate_route:
+                self.log("Hold-down of the route to", router_id, "ended, taking the route through", alternate_route[0])
+                self.update_routing_table_entry(
+                    router_id, first_hop=alternate_route[0], cost=alternate_route[1], timer=0
+                )
+                self.triggered_updates.append(router_id)
+
+    def detect_count_to_infinity(self, router_id, old_cost, cost, first_hop):
+        """
+        Poison a route early, and hold it down, if its cost keeps rising through the same neighbours. Counting to
+        infinity goes round a loop of routers, so the cost rises again and again through neighbours it has already
+        risen through, where a route failing over to genuinely worse paths moves on to new neighbours.
+        """
+        if not old_cost < cost < self.INFINITY:
+            self.rising_routes.pop(router_id, None)
+            return
+        now = time.time()
+        rising = self.rising_routes.get(router_id)
+        # Only rises in quick succession are one episode. Rises further apart are separate changes to the network.
+        if rising is None or now - rising[3] > self.update_period * self.RISING_UPDATE_PERIODS:
+            rising = self.rising_routes[router_id] = [old_cost, 0, set(), now]
+        rising[1] += 1
+        rising[2].add(first_hop)
+        rising[3] = now
+        starting_cost, increases, first_hops, _ = rising
+        if increases < self.count_to_infinity_threshold or len(first_hops) == increases:
+            return
+        self.log(
+            "Route to", router_id, "has risen in cost", increases, "times in a row through",
+            ", ".join(map(str, first_hops)) + ", poisoning it as counting to infinity"
+        )
+        self.log_event("count-to-infinity", dest=router_id, increases=increases, first_hops=sorted(first_hops))
+        self.update_routing_table_entry(router_id, cost=self.INFINITY, timer=self.timeout_length)
+        # Without hold-down enabled, hold the route down for an update period, so the loop is not straight back.
+        self.start_hold_down(router_id, starting_cost, self.hold_down or self.update_period)
+        self.triggered_updates.append(router_id)
+
     def update_routing_table_timing(self):
         """ Update the router's routing table, based on timing configuration. """
         # Keep track of the routes that need to be deleted from the routing table.
         routes_to_delete = []
+        # Keep track of the neighbours that have timed out, which all routes through need to be poisoned.
+        timed_out_neighbours = []
+        # Timers are advanced by the time actually elapsed, not the randomly offset time of the last periodic update.
+        now = int(time.time())
+        elapsed = now - self.time_of_last_timing_update
+        self.time_of_last_timing_update = now
         # Iterate over entries in the routing table.
         for router_id, route_info in self.routing_table.items():
             # Update the route's timer field.
-            self.update_routing_table_entry(
-                router_id,
-                timer=route_info[RouteInfos.TIMER] + int(time.time()) - self.time_of_last_update
-            )
+            self.update_routing_table_entry(router_id, timer=route_info[RouteInfos.TIMER] + elapsed)
             # If the route info has timed out (and wasn't already), set the route's cost to infinity.
-            timed_out = route_info[RouteInfos.TIMER] >= self.timeout_length
+            timed_out = route_info[RouteInfos.TIMER] >= self.get_timeout_length(route_info[RouteInfos.FIRST_HOP])
             if timed_out and route_info[RouteInfos.COST] != self.INFINITY:
-                self.log("Setting cost of route to", router_id, "to infinity, since it has timed out")
-                self.update_routing_table_entry(router_id, cost=self.INFINITY)
-                # Sending a triggered update here is redundant, as this method is always called before sending updates.
+                self.log("Invalidating route to", router_id, "since it has timed out")
+                # If this was the direct route to a neighbour, the neighbour is down, so are all routes through it.
+                if route_info[RouteInfos.FIRST_HOP] == router_id:
+                    timed_out_neighbours.append(router_id)
+                self.invalidate_route(router_id)
 
             # Flag the route for deletion if its update timer field is sufficiently large.
             # Cannot delete them from the routing table now, since it is being iterated over.
@@ -186,124 +1043,292 @@ class Router:
             if route_info[RouteInfos.COST] == self.INFINITY and deletion_timed_out:
                 self.log("Deleting route to", router_id, "since it has been unreachable for too long")
                 routes_to_delete.append(router_id)
+        # Poison any and all routes through neighbours that have timed out.
+        for neighbour_id in timed_out_neighbours:
+            self.poison_routes_via(neighbour_id)
         # Delete any and all routes from the routing table, that were flagged for deletion.
         for router_id in routes_to_delete:
-            self.routing_table.pop(router_id)
+            self.remove_routing_table_entry(router_id)
+            # Delta updates keep every route neighbours have through this router alive, so in delta mode a deleted
+            # route is still advertised at infinity until a full update has carried it, in case its withdrawal was
+            # lost.
+            if self.full_update_period:
+                self.withdraw_route(router_id, time.time())
+        if self.withdrawn_routes:
+            self.collect_withdrawn_routes()
         self.save_routing_table()
+        self.publish_routing_table()
+
+    def send_hellos(self, admin_down=False):
+        """
+        Send a hello to every neighbour, advertising this router's hello interval and multiplier, or that it is stopping
+        its hellos (admin down), so neighbours don't consider it down when they stop.
+        """
+        hello_packet = HelloPacket()
+        if admin_down:
+            hello_packet.interval = HelloPacket.ADMIN_DOWN_INTERVAL
+        else:
+            hello_packet.interval = round(self.hello_interval * 1000)
+            hello_packet.multiplier = self.hello_multiplier
+        for port, _ in self.outputs.values():
+            if not self.dry_run:
+                hello_packet.send(port, self.id, self.output_socket)
+        self.time_of_last_hello = time.monotonic()
+
+    def process_hello(self, buffer):
+        """ Process a hello received from a neighbour, which shows it is still alive. """
+        hello_packet = HelloPacket(buffer)
+        if not hello_packet.validate() or hello_packet.from_router_id not in self.outputs:
+            return
+        neighbour_id = hello_packet.from_router_id
+        if hello_packet.is_admin_down():
+            # The neighbour is still up, its routes stay valid until they time out as usual.
+            if neighbour_id in self.neighbour_last_hello:
+                self.log("Neighbour", neighbour_id, "stopped sending hellos")
+                self.log_event("hello-stop", neighbour=neighbour_id)
+                self.neighbour_last_hello.pop(neighbour_id)
+                self.neighbour_detect_times.pop(neighbour_id)
+            return
+        if neighbour_id not in self.neighbour_last_hello:
+            self.log(
+                "Receiving hellos from neighbour", neighbour_id, "which will be considered down after",
+                hello_packet.get_detect_time(), "seconds without one"
+            )
+            self.log_event("hello-up", neighbour=neighbour_id, detect_time=hello_packet.get_detect_time())
+            # Ask a neighbour that has come (back) up for its routing table, rather than waiting for its next update.
+            if neighbour_id not in self.routing_table or \
+                    self.routing_table[neighbour_id][RouteInfos.COST] == self.INFINITY:
+                self.send_requests([neighbour_id])
+        self.neighbour_last_hello[neighbour_id] = time.monotonic()
+        self.neighbour_detect_times[neighbour_id] = hello_packet.get_detect_time()
+
+    def check_hellos(self):
+        """
+        Invalidate every route through neighbours that have missed too many hellos in a row, flagging them for a
+        triggered update, without waiting for the routes to time out.
+        """
+        now = time.monotonic()
+        down_neighbours = [
+            neighbour_id for neighbour_id, last_hello in self.neighbour_last_hello.items()
+            if now - last_hello > self.neighbour_detect_times[neighbour_id]
+        ]
+        for neighbour_id in down_neighbours:
+            self.log(
+                "Neighbour", neighbour_id, "is down, no hello received for",
+                round(now - self.neighbour_last_hello[neighbour_id], 3), "seconds"
+            )
+            self.log_event(
+                "hello-down", neighbour=neighbour_id, silent_time=now - self.neighbour_last_hello.pop(neighbour_id)
+            )
+            self.neighbour_detect_times.pop(neighbour_id)
+            # The neighbour's direct link and advertisements can no longer be used as alternate routes.
+            self.neighbour_last_heard.pop(neighbour_id, None)
+            self.poison_routes_via(neighbour_id)
+        if down_neighbours:
+            self.save_routing_table()
+            self.publish_routing_table()
 
-    def send_updates(self, destination_router_ids):
-        """ Send a RIP update packet for each given destination router id to all outputs (neighbours). """
+    def get_read_timeout(self):
+        """
+        Get how long to wait for sockets to be ready to be read from, no longer than until the next hellos are due to be
+        sent, a neighbour is due to be considered down, or the next paced packet is due to be sent.
+        """
+        now = time.monotonic()
+        read_timeout = self.READ_TIMEOUT
+        if self.hello_interval is not None:
+            read_timeout = min(read_timeout, self.time_of_last_hello + self.hello_interval - now)
+        for neighbour_id, last_hello in self.neighbour_last_hello.items():
+            read_timeout = min(read_timeout, last_hello + self.neighbour_detect_times[neighbour_id] - now)
+        for neighbour_id in self.send_queues:
+            read_timeout = min(read_timeout, self.time_of_next_send.get(neighbour_id, 0) - now)
+        return max(read_timeout, 0)
+
+    def send_updates(
+            self, destination_router_ids, neighbour_ids=None, delta=False, periodic=False, withdraw=False, unknown=False
+    ):
+        """
+        Send RIP update packets for the given destination router ids to the given outputs (neighbours), or all of them.
+        Routes are split over as many packets as needed. If delta, only send routes whose cost has changed since it was
+        last sent to each neighbour. Periodic is only used to trace whether route changes waited for a periodic update.
+        If withdraw, every route is sent at infinity. If unknown, destinations with no route are sent at infinity
+        rather than left out. If send pacing is enabled, packets are queued to be sent to each neighbour that far apart.
+        """
         # Remove duplicate router ids.
         destination_router_ids = set(destination_router_ids)
+        if self.summary_prefixes:
+            destination_router_ids = self.summarize(destination_router_ids)
+        neighbour_ids = list(self.outputs) if neighbour_ids is None else neighbour_ids
         self.log(
-            "Sending routing update packets to all neighbours for the routes to",
-            ", ".join(map(str, destination_router_ids))
+            "Sending " + ("changed routes in " if delta else "") + "routing update packets to neighbours",
+            ", ".join(map(str, neighbour_ids)), "for the routes to", ", ".join(map(str, destination_router_ids))
         )
-        for neighbour_id, (port, cost) in self.outputs.items():
-            # Create the RIP packet to send to this output.
-            rip_packet = RIPPacket()
-            # Add entries to the RIP packet.
-            for destination_router_id in destination_router_ids:
-                if destination_router_id not in self.routing_table:
-                    continue
-                route_info = self.routing_table[destination_router_id]
-                # Add the entry, with a cost of infinity if the first hop to the destination is the router this packet
-                # is being sent to (split horizon with poisoned reverse).
-                rip_packet.add_entry(
-                    destination_router_id,
-                    self.INFINITY if route_info[RouteInfos.FIRST_HOP] == neighbour_id else route_info[RouteInfos.COST]
-                )
-            rip_packet.send(port, self.id)
-
-    def process_inputs(self):
-        """ Process any and all inputs from neighbour routers. Updating routing table where necessary. """
-        # Read any and all information from input sockets.
-        read_ready = select(self.input_sockets.values(), [], [], self.READ_TIMEOUT)[0]
-        for input_socket in read_ready:
+        # Look up each route once, rather than once per neighbour, along with the trace of its last change.
+        routes = []
+        for destination_router_id in destination_router_ids:
+            route = self.get_advertised_route(destination_router_id) if not withdraw else (self.INFINITY, None)
+            if route is None and unknown:
+                route = (self.INFINITY, None)
+            if route is not None:
+                trace = self.route_traces.get(destination_router_id, RIPPacket.NO_TRACE)
+                routes.append((destination_router_id,) + route + (trace,))
+        # Advertise the time until the next periodic update, while it can be stretched, so neighbours can scale their
+        # timeouts to it.
+        update_period = self.current_update_period if self.max_update_period is not None else 0
+        # The router info entry of a delta update, or one advertising the update period, takes up one of its entries.
+        max_entries = RIPPacket.MAX_ENTRIES - 1 if delta or update_period else RIPPacket.MAX_ENTRIES
+        for neighbour_id in neighbour_ids:
+            # Keep track of the costs sent to this neighbour, so that later delta updates know what has changed.
+            advertised_costs = self.advertised_costs.setdefault(neighbour_id, {}) if self.full_update_period else None
+            # Get the entries to send. Routes whose first hop is the router they are being sent to are sent with a cost
+            # of infinity (split horizon with poisoned reverse).
+            entries = []
+            for destination_router_id, route_cost, first_hop, trace in routes:
+                cost = self.INFINITY if first_hop == neighbour_id else route_cost
+                if advertised_costs is not None:
+                    if delta and advertised_costs.get(destination_router_id) == cost:
+                        continue
+                    advertised_costs[destination_router_id] = cost
+                entries.append((destination_router_id, cost, trace))
+            # Split the entries over as many RIP packets as needed, sending at least one even if there are no entries.
+            for start in range(0, max(len(entries), 1), max_entries):
+                rip_packet = RIPPacket()
+                rip_packet.update_period = update_period
+                if delta:
+                    rip_packet.flags |= RIPPacket.FLAG_DELTA
+                for destination_router_id, cost, trace in entries[start:start + max_entries]:
+                    rip_packet.add_destination(destination_router_id, cost, trace)
+                if self.send_pacing is None:
+                    self.send_packet(neighbour_id, rip_packet, periodic)
+                else:
+                    # A queue that has been empty starts again from now, rather than from when it was last sent from.
+                    if neighbour_id not in self.send_queues:
+                        self.time_of_next_send[neighbour_id] = max(
+                            self.time_of_next_send.get(neighbour_id, 0), time.monotonic()
+                        )
+                    self.send_queues.setdefault(neighbour_id, deque()).append((rip_packet, periodic))
+        if self.send_queues:
+            self.send_queued_packets()
 
-            # Form a RIP Packet from the input socket's buffer.
-            buffer = input_socket.recv(512)
-            rip_packet = RIPPacket(buffer)
+    def send_packet(self, neighbour_id, rip_packet, periodic=False):
+        """ Send a RIP update packet to a neighbour straight away. """
+        # Traces are logged before sending, so that they are never logged after the neighbour has received them.
+        if self.tracing:
+            self.log_sent_traces(rip_packet, neighbour_id, periodic)
+        if not self.dry_run:
+            rip_packet.send(self.outputs[neighbour_id][0], self.id, self.output_socket)
+        self.log_event(
+            "send", neighbour=neighbour_id, entries=len(rip_packet.entries),
+            delta=bool(rip_packet.flags & RIPPacket.FLAG_DELTA)
+        )
 
-            if not rip_packet.validate():
+    def send_queued_packets(self):
+        """
+        Send the queued packets that have fallen due to each neighbour, so that the packets of an update are spread
+        over a short window rather than overflowing the neighbour's input buffer, as recommended by RFC 2453.
+        """
+        now = time.monotonic()
+        pacing = (self.send_pacing or 0) / 1000
+        for neighbour_id, send_queue in list(self.send_queues.items()):
+            # Drop the packets queued for neighbours that have since been removed from the configuration.
+            if neighbour_id not in self.outputs:
+                self.send_queues.pop(neighbour_id)
+                self.time_of_next_send.pop(neighbour_id, None)
                 continue
+            # Packets fall due one pacing interval after another, so if the main loop has been held up for longer than
+            # that, as many as have fallen due since are sent at once.
+            next_send = self.time_of_next_send[neighbour_id]
+            while send_queue and next_send <= now:
+                self.send_packet(neighbour_id, *send_queue.popleft())
+                next_send += pacing
+            self.time_of_next_send[neighbour_id] = next_send
+            if not send_queue:
+                self.send_queues.pop(neighbour_id)
 
-            # Get the id of the input (neighbour) router that has sent the update.
-            input_router_id = rip_packet.from_router_id
-            self.log(
-                "Processing routing update packet from router",
-                input_router_id, "from port", input_socket.getsockname()[1]
-            )
-
-            # Get the cost of the route to the input router that has sent the update.
-            input_router_cost = self.outputs[input_router_id][1]
-
-            # Reset the timer field of the route to the input router, as this update verifies it is still alive.
-            # If this router's known link cost is less than the existing route, update the cost.
-            input_router_cost_update = input_router_cost
+    def flush_send_queues(self):
+        """ Send every queued packet, waiting between the packets to each neighbour as paced. """
+        while self.send_queues:
+            self.send_queued_packets()
+            if self.send_queues:
+                next_send = min(self.time_of_next_send.get(neighbour_id, 0) for neighbour_id in self.send_queues)
+                time.sleep(max(next_send - time.monotonic(), 0))
 
-            if input_router_id in self.routing_table:
-                current_input_router_cost = self.routing_table[input_router_id][RouteInfos.COST]
+    def send_requests(self, neighbour_ids=None):
+        """ Request the whole routing table of the given outputs (neighbours), or all of them. """
+        neighbour_ids = list(self.outputs) if neighbour_ids is None else neighbour_ids
+        self.log("Requesting routing tables from neighbours", ", ".join(map(str, neighbour_ids)))
+        for neighbour_id in neighbour_ids:
+            rip_packet = RIPPacket()
+            rip_packet.request_whole_table()
+            if not self.dry_run:
+                rip_packet.send(self.outputs[neighbour_id][0], self.id, self.output_socket)
 
-                input_router_cost_update = input_router_cost if input_router_cost <= current_input_router_cost else None
+    def answer_request(self, rip_packet, input_router_id):
+        """ Answer a RIP request from a neighbour straight away, with split horizon with poisoned reverse applied. """
+        if rip_packet.is_whole_table_request():
+            self.log("Answering request for the whole routing table from router", input_router_id)
+            self.send_updates(self.get_advertised_destinations(), [input_router_id])
+            self.full_update_neighbours.discard(input_router_id)
+        else:
+            self.log("Answering request for specific routes from router", input_router_id)
+            # Destinations with no route are answered at infinity (RFC 2453 section 3.9.1), so the requester can tell
+            # them from a lost answer.
+            self.send_updates([entry["destination"] for entry in rip_packet.entries], [input_router_id], unknown=True)
 
-            self.update_routing_table_entry(
-                input_router_id, first_hop=input_router_id, timer=0, cost=input_router_cost_update
-            )
+    def send_periodic_updates(self):
+        """ Send the routing table to all neighbours, or only changed routes if between full updates in delta mode. """
+        full_update_due = time.time() - self.time_of_last_full_update >= self.full_update_period \
+            if self.full_update_period else True
+        if full_update_due:
+            if self.verbose:
+                print("\t---> Sending routing table to all neighbours.")
+            self.log("Sending routing table to all neighbours")
+            self.send_updates(self.get_advertised_destinations(), periodic=True)
+            self.time_of_last_full_update = time.time()
+        else:
+            # Neighbours that have just come up have nothing to apply changes to, so send them the full table.
+            full_update_neighbours = [
+                neighbour_id for neighbour_id in self.full_update_neighbours if neighbour_id in self.outputs
+            ]
+            delta_neighbours = [
+                neighbour_id for neighbour_id in self.outputs if neighbour_id not in self.full_update_neighbours
+            ]
+            if self.verbose:
+                print("\t---> Sending changed routes to all neighbours.")
+            self.log("Sending changed routes to all neighbours")
+            if full_update_neighbours:
+                self.send_updates(self.get_advertised_destinations(), full_update_neighbours, periodic=True)
+            # Neighbours with no changes to apply still get an empty packet, to keep routes through this router alive.
+            self.send_updates(self.get_advertised_destinations(), delta_neighbours, delta=True, periodic=True)
+        self.full_update_neighbours.clear()
 
-            # Process RIP packet entries
-            for entry in rip_packet.entries:
-                destination_router_id = entry["router_id"]
-
-                # If the entry's cost is over infinity, set it to infinity.
-                if entry[RouteInfos.COST] > self.INFINITY:
-                    self.log("Received routing update packet entry with a cost larger than infinity")
-                    entry[RouteInfos.COST] = self.INFINITY
-
-                # If the entry's destination router id is this router, skip the entry.
-                if destination_router_id == self.id:
-                    continue
-
-                # Get the update cost of the route based on the cost to the input router, and the input routers cost of
-                # the route, limited to infinity.
-                update_cost = min(input_router_cost + entry[RouteInfos.COST], self.INFINITY)
-
-                if destination_router_id not in self.routing_table:
-                    if update_cost != self.INFINITY:
-                        self.log("Processing routing update packet entry for a route not yet in the routing table")
-                        # The entry describes a reachable route this router does not have,
-                        # so add the route to the routing table.
-                        self.update_routing_table_entry(
-                            destination_router_id,
-                            first_hop=input_router_id,
-                            cost=update_cost,
-                            timer=0
-                        )
+    def process_inputs(self):
+        """ Process any and all inputs from neighbour routers. Updating routing table where necessary. """
+        # Read any and all information from input sockets.
+        read_ready = select(self.input_sockets.values(), [], [], self.get_read_timeout())[0]
+        routing_packets = 0
+        for input_socket in read_ready:
+            input_port = input_socket.getsockname()[1]
+            # Read every datagram waiting on the socket, rather than one per select, so that bursts of update packets
+            # do not back up in its buffer.
+            for _ in range(self.MAX_READS):
+                try:
+                    buffer = input_socket.recv(512)
+                except BlockingIOError:
+                    break
+                if self.capture_writer:
+                    self.capture_writer.write(time.time(), input_port, buffer)
+                if HelloPacket.is_hello(buffer):
+                    self.process_hello(buffer)
                 else:
-                    self.log("Processing routing update packet entry for a route already in the routing table")
-                    existing_route_info = self.routing_table[destination_router_id]
-                    input_is_first_hop = input_router_id == existing_route_info[RouteInfos.FIRST_HOP]
-
-                    if input_is_first_hop and update_cost != self.INFINITY:
-                        # At the very least, even if the cost hasn't changed, the route's timer should be reset.
-                        self.update_routing_table_entry(destination_router_id, timer=0)
-
-                    cost_changed = update_cost != existing_route_info[RouteInfos.COST]
-                    cost_lower = update_cost < existing_route_info[RouteInfos.COST]
-                    if (input_is_first_hop and cost_changed) or cost_lower:
-                        self.log("Processing routing update packet entry with updated cost")
-                        self.update_routing_table_entry(
-                            destination_router_id,
-                            first_hop=input_router_id,
-                            cost=update_cost,
-                            timer=self.timeout_length if update_cost == self.INFINITY else 0
-                        )
-                        if update_cost == self.INFINITY:
-                            self.log("Cost=INF. Flagging route to", destination_router_id, "for triggered update")
-                            self.triggered_updates.append(destination_router_id)
+                    self.process_packet(buffer, input_port)
+                    routing_packets += 1
+        if self.event_log_file:
+            self.event_log_file.flush()
+        if read_ready and self.capture_writer:
+            self.capture_writer.flush()
 
-        # Only print and save routing table if there was at least one input to process.
-        if read_ready:
+        # Only print and save routing table if there was at least one routing packet to process, not just hellos.
+        if routing_packets:
             if self.verbose:
                 print("<--- Processed input. Routing table:")
             else:
@@ -313,11 +1338,217 @@ class Router:
             print(self.get_string_routing_table())
             self.check_if_converged()
             self.save_routing_table()
+            self.publish_routing_table()
+
+    def process_packet(self, buffer, input_port):
+        """ Process a single datagram received on an input port. Updating routing table where necessary. """
+        # Form a RIP Packet from the datagram.
+        rip_packet = RIPPacket(buffer)
+
+        if not rip_packet.validate():
+            return
+
+        # Get the id of the input (neighbour) router that has sent the update.
+        input_router_id = rip_packet.from_router_id
+        if input_router_id not in self.outputs:
+            self.log("Ignoring routing update packet from router", input_router_id, "as it is not a neighbour")
+            return
+        self.log("Processing routing update packet from router", input_router_id, "from port", input_port)
+        self.neighbour_last_heard[input_router_id] = time.time()
+        # Keep track of how long the neighbour may go between updates. Requests do not say.
+        if rip_packet.update_period:
+            self.neighbour_update_periods[input_router_id] = rip_packet.update_period
+        elif not rip_packet.is_request():
+            self.neighbour_update_periods.pop(input_router_id, None)
+        self.log_event(
+            "receive", neighbour=input_router_id, entries=len(rip_packet.costs), request=rip_packet.is_request()
+        )
+
+        # Routers never advertise themselves, unless shutting down, when they advertise themselves at infinity. Routes
+        # through a neighbour shutting down are invalidated straight away, rather than when they time out.
+        if not rip_packet.is_request() and input_router_id in rip_packet.addresses:
+            index = rip_packet.addresses.index(input_router_id)
+            if not rip_packet.masks[index] and rip_packet.costs[index] == self.INFINITY:
+                self.log("Neighbour", input_router_id, "is shutting down")
+                self.neighbour_last_heard.pop(input_router_id, None)
+                self.neighbour_update_periods.pop(input_router_id, None)
+                self.neighbour_last_hello.pop(input_router_id, None)
+                self.neighbour_detect_times.pop(input_router_id, None)
+                if self.tracing:
+                    entry_traces = self.receive_traces(
+                        rip_packet, input_router_id, [self.INFINITY] * len(rip_packet.costs)
+                    )
+                    self.current_trace = entry_traces.get(input_router_id, RIPPacket.NO_TRACE)
+                self.poison_routes_via(input_router_id)
+                self.current_trace = RIPPacket.NO_TRACE
+                return
+
+        # Get the cost of the route to the input router that has sent the update.
+        input_router_cost = self.outputs[input_router_id][1]
+
+        # A neighbour that was unreachable has come (back) up, so will need a full update, and may have routes this
+        # router no longer has. If it has sent a request, it has just started, so has nothing worth asking for yet.
+        if input_router_id not in self.routing_table or \
+                self.routing_table[input_router_id][RouteInfos.COST] == self.INFINITY:
+            self.full_update_neighbours.add(input_router_id)
+            if not rip_packet.is_request():
+                self.send_requests([input_router_id])
+
+        # Reset the timer field of the route to the input router, as this update verifies it is still alive.
+        # Only take over the route if it is through the input router already, or the direct link is no more costly, so
+        # that a cheaper route to the input router through another neighbour keeps its first hop.
+        if input_router_id in self.routing_table:
+            current_input_route_info = self.routing_table[input_router_id]
+            direct_link_best = input_router_cost <= current_input_route_info[RouteInfos.COST]
+            if direct_link_best or current_input_route_info[RouteInfos.FIRST_HOP] == input_router_id:
+                self.update_routing_table_entry(
+                    input_router_id, first_hop=input_router_id, timer=0, cost=input_router_cost
+                )
+        else:
+            self.update_routing_table_entry(input_router_id, first_hop=input_router_id, timer=0, cost=input_router_cost)
+
+        if rip_packet.is_request():
+            self.answer_request(rip_packet, input_router_id)
+            return
+
+        # A delta update confirms every reachable route through the input router it does not mention is unchanged, so
+        # reset their timers as if they had been sent.
+        if rip_packet.flags & RIPPacket.FLAG_DELTA:
+            self.log("Resetting timers of routes through", input_router_id, "for delta update")
+            for router_id in self.first_hop_routes.get(input_router_id, ()):
+                route_info = self.routing_table[router_id]
+                if route_info[RouteInfos.COST] != self.INFINITY:
+                    route_info[RouteInfos.TIMER] = 0
+
+        received_costs = self.received_costs.setdefault(input_router_id, {})
+        infinity = self.INFINITY
+        routing_table = self.routing_table
+        # Entries for this router, or prefixes it originates, are skipped.
+        skipped_destinations = set(self.prefixes)
+        skipped_destinations.add(self.id)
+
+        # Work out what every entry means for the routing table in a single pass, from the packet's entry arrays. Most
+        # entries of a periodic update only confirm a route in use is unchanged, so just reset its timer here, and
+        # leave the slower work of updating routes to the entries that change them.
+        refreshed = 0
+        update_costs = [min(input_router_cost + cost, infinity) for cost in rip_packet.costs]
+        # Route changes caused by traced entries carry on their traces.
+        entry_traces = self.receive_traces(rip_packet, input_router_id, update_costs) if self.tracing else {}
+        for destination_router_id, update_cost in zip(rip_packet.get_destinations(), update_costs):
+            if destination_router_id in skipped_destinations:
+                continue
+
+            # Remember the advertisement, in case the route through the input router is needed as an alternate.
+            if update_cost == infinity:
+                received_costs.pop(destination_router_id, None)
+            else:
+                received_costs[destination_router_id] = update_cost
+
+            route_info = routing_table.get(destination_router_id)
+            if route_info is None:
+                if update_cost != infinity:
+                    self.current_trace = entry_traces.get(destination_router_id, RIPPacket.NO_TRACE)
+                    self.process_entry(destination_router_id, update_cost, input_router_id)
+            elif route_info[RouteInfos.FIRST_HOP] == input_router_id and update_cost == route_info[RouteInfos.COST]:
+                if update_cost != infinity:
+                    route_info[RouteInfos.TIMER] = 0
+                    refreshed += 1
+            elif route_info[RouteInfos.FIRST_HOP] == input_router_id or update_cost < route_info[RouteInfos.COST]:
+                self.current_trace = entry_traces.get(destination_router_id, RIPPacket.NO_TRACE)
+                self.process_entry(destination_router_id, update_cost, input_router_id)
+        self.current_trace = RIPPacket.NO_TRACE
+        if refreshed:
+            self.log("Reset the timers of", refreshed, "unchanged routes through", input_router_id)
+
+    def process_entry(self, destination_router_id, update_cost, input_router_id):
+        """
+        Process a single RIP packet entry that changes the routing table, given the cost of the route to its
+        destination through the input (neighbour) router that sent it.
+        """
+        # Routes no better than a route that was poisoned are ignored while it is held down. Poisoned routes never are,
+        # in case the destination has since been reached another way.
+        if self.hold_downs and update_cost != self.INFINITY and self.is_held_down(destination_router_id, update_cost):
+            self.log("Ignoring route to", destination_router_id, "of cost", update_cost, "as it is held down")
+            return
+
+        if destination_router_id not in self.routing_table:
+            if update_cost != self.INFINITY:
+                self.log("Processing routing update packet entry for a route not yet in the routing table")
+                # The entry describes a reachable route this router does not have,
+                # so add the route to the routing table.
+                self.update_routing_table_entry(
+                    destination_router_id,
+                    first_hop=input_router_id,
+                    cost=update_cost,
+                    timer=0
+                )
+        else:
+            self.log("Processing routing update packet entry for a route already in the routing table")
+            existing_route_info = self.routing_table[destination_router_id]
+            existing_cost = existing_route_info[RouteInfos.COST]
+            input_is_first_hop = input_router_id == existing_route_info[RouteInfos.FIRST_HOP]
+
+            if input_is_first_hop and update_cost != self.INFINITY:
+                # At the very least, even if the cost hasn't changed, the route's timer should be reset.
+                self.update_routing_table_entry(destination_router_id, timer=0)
+
+            cost_changed = update_cost != existing_route_info[RouteInfos.COST]
+            cost_lower = update_cost < existing_route_info[RouteInfos.COST]
+            cost_higher = update_cost > existing_route_info[RouteInfos.COST]
+            if (input_is_first_hop and cost_changed) or cost_lower:
+                self.log("Processing routing update packet entry with updated cost")
+                # If the route in use has got worse, a route through another neighbour may now be better.
+                alternate_route = self.find_alternate_route(destination_router_id, exclude=input_router_id) \
+                    if input_is_first_hop and cost_higher else None
+                if alternate_route and update_cost == self.INFINITY and \
+                        not self.is_trusted_alternate(alternate_route, existing_cost):
+                    alternate_route = None
+                if alternate_route and alternate_route[1] < update_cost:
+                    self.log("Route through", alternate_route[0], "is now the best route to", destination_router_id)
+                    self.update_routing_table_entry(
+                        destination_router_id, first_hop=alternate_route[0], cost=alternate_route[1], timer=0
+                    )
+                    self.triggered_updates.append(destination_router_id)
+                else:
+                    self.update_routing_table_entry(
+                        destination_router_id,
+                        first_hop=input_router_id,
+                        cost=update_cost,
+                        timer=self.timeout_length if update_cost == self.INFINITY else 0
+                    )
+                    if update_cost == self.INFINITY:
+                        self.log("Cost=INF. Flagging route to", destination_router_id, "for triggered update")
+                        self.triggered_updates.append(destination_router_id)
+                        if existing_cost != self.INFINITY:
+                            self.start_hold_down(destination_router_id, existing_cost)
 
     def run(self):
         """ Process outputs and inputs. Send any triggered updates and handle timing and garbage collection. """
         while True:
             try:  # Temporary. To avoid Windows 10 bug when using print() statements to cmd.exe stdout.
+                if self.shutdown_requested:
+                    self.shut_down()
+                    return
+
+                # Apply any configuration changes requested since the last loop.
+                if self.reload_requested:
+                    self.reload_config()
+
+                # Send hellos when due, and invalidate routes through neighbours that have stopped sending them.
+                if self.hello_interval is not None and \
+                        time.monotonic() - self.time_of_last_hello >= self.hello_interval:
+                    self.send_hellos()
+                if self.neighbour_last_hello:
+                    self.check_hellos()
+
+                # Send the next packets queued for neighbours, as they fall due.
+                if self.send_queues:
+                    self.send_queued_packets()
+
+                # End any hold-downs that have run their length.
+                if self.hold_downs:
+                    self.end_hold_downs()
+
                 # If there is any router ids in the triggered update queue, send the updates.
                 if self.triggered_updates:
                     if self.verbose:
@@ -328,14 +1559,18 @@ class Router:
                     self.triggered_updates = []
 
                 # If it is time to send updates, update the routing table, then send it.
-                if time.time() - self.time_of_last_update >= self.update_period:
+                if time.time() - self.time_of_last_update >= self.current_update_period:
                     self.log("Updating routing table based on timeouts")
                     self.update_routing_table_timing()
-                    if self.verbose:
-                        print("\t---> Sending routing table to all neighbours.")
-                    self.log("Sending routing table to all neighbours")
-                    self.send_updates(self.routing_table.keys())
+                    self.adapt_update_period()
+                    self.send_periodic_updates()
+                    self.check_socket_drops()
                     self.time_of_last_update = int(time.time()) + random.randint(-5, 5)
+                # While the update period is stretched, still check for timed out routes every (base) update period.
+                elif self.current_update_period != self.update_period and \
+                        time.time() - self.time_of_last_timing_update >= self.update_period:
+                    self.log("Updating routing table based on timeouts")
+                    self.update_routing_table_timing()
 
                 self.process_inputs()
             except OSError:
@@ -369,6 +1604,25 @@ class RouteInfo(OrderedDict):
         return RouteInfo(self[RouteInfos.FIRST_HOP], self[RouteInfos.COST], self[RouteInfos.TIMER])
 
 
+def read_udp_drops():
+    """
+    Read the number of datagrams the kernel has dropped for each local UDP port, from /proc/net/udp. Return a map of
+    ports to drops, or None where the kernel does not provide them (anywhere other than Linux).
+    """
+    try:
+        with open("/proc/net/udp") as udp_file:
+            lines = udp_file.readlines()[1:]
+    except OSError:
+        return None
+    drops = {}
+    for line in lines:
+        fields = line.split()
+        # The local address is the second field, as <hex address>:<hex port>. Drops are the last field.
+        port = int(fields[1].split(":")[1], 16)
+        drops[port] = drops.get(port, 0) + int(fields[-1])
+    return drops
+
+
 def main():
     args = sys.argv
     if len(args) < 2:
@@ -381,6 +1635,7 @@ def main():
 
     router = Router(config_lines)
     router.config_dir = "/".join(config_filename.split("/")[:-1])
+    router.config_filename = config_filename
 
     options = []
     if len(args) >= 3:
@@ -388,8 +1643,27 @@ def main():
 
     router.load = "load" in options or "l" in options
     router.verbose = "verbose" in options or "v" in options
+    if "capture" in options or "c" in options:
+        router.start_capture()
+    if "events" in options or "e" in options:
+        router.start_event_log()
+    if "trace" in options or "t" in options:
+        router.start_tracing()
     router.bind_input_sockets()
+    router.open_output_socket()
     router.initialise_routing_table()
+    router.start_forwarding_table()
+    if router.query_port is not None:
+        router.start_query_server()
+    # Ask neighbours for their routing tables, rather than waiting for their next periodic update.
+    router.send_requests()
+
+    # Reload the config file on SIGHUP, where the platform supports it.
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, router.request_reload)
+    # Withdraw all routes from neighbours before exiting on SIGTERM or SIGINT (Ctrl+C).
+    signal.signal(signal.SIGTERM, router.request_shutdown)
+    signal.signal(signal.SIGINT, router.request_shutdown)
 
     router.run()
 
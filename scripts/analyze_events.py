@@ -0,0 +1,222 @@
+"""
+Analyse the event logs of every router of a network (recorded by running routers with the 'events' option), streamed
+in merged time order so that memory use does not grow with the length of the logs.
+
+Usage (from the scripts directory):
+    python analyze_events.py <logs-dir-or-event-log-files...> [options...]
+
+Options:
+    gap=<seconds>       Route changes to a destination further apart than this start a new convergence episode,
+                        2 seconds by default.
+    steps=<n>           Number of consecutive cost increases of a route that count as counting to infinity,
+                        3 by default.
+    timeline=<dest>     Print every route change to the given destination, as it is streamed.
+
+Prints each convergence episode of a destination as it ends, with when it started, how long it took and the number of
+route changes across all routers, and each counting to infinity episode as it ends. Only episodes still in progress
+are kept, so memory use does not grow with the length of the logs either. Then reports the totals of the episodes, the
+number of hold-downs and of counting to infinity detected by the routers themselves, and the update volume of each
+router, with the datagrams the kernel dropped.
+"""
+
+import glob
+import heapq
+import json
+import os
+import sys
+
+INFINITY = 16
+DEFAULT_GAP = 2
+DEFAULT_STEPS = 3
+
+
+def read_events(filename):
+    """
+    Stream the events of an event log. Lines that are not complete JSON objects, such as a partly written last line,
+    are skipped.
+    """
+    with open(filename) as event_log:
+        for line in event_log:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def merge_events(filenames):
+    """ Stream the events of several event logs, in time order. Each log is already in time order. """
+    return heapq.merge(*(read_events(filename) for filename in filenames), key=lambda event: event["time"])
+
+
+class Analyzer:
+    def __init__(self, gap=DEFAULT_GAP, steps=DEFAULT_STEPS, timeline_dest=None, print_episodes=False):
+        self.gap = gap
+        self.steps = steps
+        self.timeline_dest = timeline_dest
+        self.print_episodes = print_episodes  # Whether to print each episode as it ends.
+        self.start_time = None
+        self.end_time = None
+        # Map destinations to their [start, end, route changes, set of router ids] convergence episode in progress.
+        self.episodes = {}
+        self.time_of_last_sweep = None  # Time episodes in progress were last checked for having ended.
+        self.convergence_episodes = 0
+        self.longest_convergence = 0
+        # Map (router id, destination) pairs to [start time, consecutive cost increases] of routes whose cost is rising.
+        self.rising_costs = {}
+        self.count_to_infinity_episodes = 0
+        self.count_to_infinity_increases = 0
+        self.count_to_infinity_time = 0
+        self.hold_downs = 0
+        self.count_to_infinity_detections = 0  # Routes poisoned early by routers detecting counting to infinity.
+        self.socket_drops = 0  # Datagrams the kernel dropped for want of space in routers' input socket buffers.
+        # Map router ids to counters of packets sent, entries sent, packets received, route changes and neighbours lost.
+        self.volumes = {}
+
+    def process(self, event):
+        now = event["time"]
+        self.start_time = now if self.start_time is None else self.start_time
+        self.end_time = now
+        volume = self.volumes.setdefault(event["router"], dict.fromkeys(
+            ("sent", "entries sent", "received", "route changes", "neighbours down"), 0
+        ))
+        if event["event"] == "send":
+            volume["sent"] += 1
+            volume["entries sent"] += event["entries"]
+        elif event["event"] == "receive":
+            volume["received"] += 1
+        elif event["event"] == "neighbour-down":
+            volume["neighbours down"] += 1
+        elif event["event"] == "hold-down":
+            self.hold_downs += 1
+        elif event["event"] == "count-to-infinity":
+            self.count_to_infinity_detections += 1
+        elif event["event"] == "socket-drops":
+            self.socket_drops += event["drops"]
+        elif event["event"] == "route":
+            volume["route changes"] += 1
+            self.process_route_change(event)
+
+    def process_route_change(self, event):
+        now = event["time"]
+        dest = event["dest"]
+        if self.timeline_dest is not None and str(dest) == self.timeline_dest:
+            print("{:10.3f}s router {:5} first hop {} -> {}, cost {} -> {}".format(
+                now - self.start_time, event["router"], event["old_first_hop"], event["first_hop"],
+                event["old_cost"], event["cost"]
+            ))
+
+        # Every gap, end the episodes with no route changes for longer than it.
+        if self.time_of_last_sweep is None or now - self.time_of_last_sweep > self.gap:
+            self.time_of_last_sweep = now
+            for ended_dest in [
+                episode_dest for episode_dest, episode in self.episodes.items() if now - episode[1] > self.gap
+            ]:
+                self.end_episode(ended_dest)
+        episode = self.episodes.get(dest)
+        if episode is not None and now - episode[1] > self.gap:
+            self.end_episode(dest)
+            episode = None
+        if episode is None:
+            episode = self.episodes[dest] = [now, now, 0, set()]
+        episode[1] = now
+        episode[2] += 1
+        episode[3].add(event["router"])
+
+        # Counting to infinity shows as a route's cost being raised again and again while still reachable.
+        key = (event["router"], dest)
+        old_cost, cost = event["old_cost"], event["cost"]
+        if old_cost is not None and old_cost < cost < INFINITY:
+            rising = self.rising_costs.setdefault(key, [now, 0])
+            rising[1] += 1
+        elif key in self.rising_costs:
+            start, increases = self.rising_costs.pop(key)
+            if increases >= self.steps:
+                self.end_count_to_infinity(event["router"], dest, start, now, increases, cost)
+
+    def end_episode(self, dest):
+        """ Count the convergence episode of a destination that has ended, printing it if printing episodes. """
+        start, end, changes, router_ids = self.episodes.pop(dest)
+        self.convergence_episodes += 1
+        self.longest_convergence = max(self.longest_convergence, end - start)
+        if self.print_episodes:
+            print("  destination {:>18}: {:10.3f}s, converged in {:7.3f}s, {:4} route changes at {} routers".format(
+                str(dest), start - self.start_time, end - start, changes, len(router_ids)
+            ))
+
+    def end_count_to_infinity(self, router_id, dest, start, end, increases, cost):
+        """ Count a counting to infinity episode that has ended, printing it if printing episodes. """
+        self.count_to_infinity_episodes += 1
+        self.count_to_infinity_increases += increases
+        self.count_to_infinity_time += end - start
+        if self.print_episodes:
+            print((
+                "  router {:5} destination {:>18}: {:10.3f}s, counted to infinity, {} increases over {:.3f}s, {}"
+            ).format(
+                router_id, str(dest), start - self.start_time, increases, end - start,
+                "ended at cost {}".format(cost) if cost is not None else "still rising"
+            ))
+
+    def finish(self):
+        """ End any episodes still in progress at the end of the logs. """
+        for dest in sorted(self.episodes, key=lambda dest: self.episodes[dest][0]):
+            self.end_episode(dest)
+        for (router_id, dest), (start, increases) in self.rising_costs.items():
+            if increases >= self.steps:
+                self.end_count_to_infinity(router_id, dest, start, self.end_time, increases, None)
+        self.rising_costs = {}
+
+    def report(self):
+        if self.start_time is None:
+            print("No events")
+            return
+        duration = self.end_time - self.start_time
+        print("Events span {:.3f}s".format(duration))
+
+        print("Convergence episodes: {}, longest {:.3f}s".format(self.convergence_episodes, self.longest_convergence))
+        print((
+            "Counting to infinity episodes ({} or more consecutive cost increases): {}, {} increases over {:.3f}s"
+        ).format(
+            self.steps, self.count_to_infinity_episodes, self.count_to_infinity_increases, self.count_to_infinity_time
+        ))
+        print("Hold-downs started: {}, counting to infinity detected by routers: {}".format(
+            self.hold_downs, self.count_to_infinity_detections
+        ))
+
+        print("\nUpdate volume per router:")
+        print("  {:>6} {:>10} {:>12} {:>10} {:>14} {:>16} {:>10}".format(
+            "Router", "Sent", "Entries sent", "Received", "Route changes", "Neighbours down", "Sent/s"
+        ))
+        for router_id, volume in sorted(self.volumes.items()):
+            print("  {:>6} {:>10} {:>12} {:>10} {:>14} {:>16} {:>10.2f}".format(
+                router_id, volume["sent"], volume["entries sent"], volume["received"], volume["route changes"],
+                volume["neighbours down"], volume["sent"] / duration if duration else 0
+            ))
+        print("Datagrams dropped by the kernel, for want of input buffer space: {}".format(self.socket_drops))
+
+
+def main():
+    args = sys.argv[1:]
+    paths = [arg for arg in args if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in args if "=" in arg)
+    if not paths:
+        print(__doc__)
+        return
+    filenames = []
+    for path in paths:
+        filenames += sorted(glob.glob(os.path.join(path, "events-*.jsonl"))) if os.path.isdir(path) else [path]
+    if not filenames:
+        print("No event logs found")
+        return
+
+    analyzer = Analyzer(
+        float(options.get("gap", DEFAULT_GAP)), int(options.get("steps", DEFAULT_STEPS)), options.get("timeline"), True
+    )
+    print("Convergence and counting to infinity episodes as they end (times relative to the first event):")
+    for event in merge_events(filenames):
+        analyzer.process(event)
+    analyzer.finish()
+    analyzer.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+Microbenchmarks for the router's hot paths. Only loopback networking is used.
+
+Usage (from the scripts directory):
+    python benchmarks.py [run] [name-filter]
+        Run the benchmarks and print their results.
+    python benchmarks.py save [baseline-file] [name-filter]
+        Run the benchmarks and save their results as a JSON baseline.
+    python benchmarks.py compare [baseline-file] [name-filter] [threshold=<fraction>]
+        Run the benchmarks and compare them against a baseline. Exits with status 1 if any benchmark is slower than
+        its baseline by more than the threshold (a fraction, 0.25 by default).
+
+Results are in microseconds per operation, or per entry for the per-entry benchmarks. Router logging is disabled,
+so that only the hot path itself is measured.
+
+Also has the helpers the network benchmarks (such as convergence_benchmark.py) use to run routers as processes.
+"""
+
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append('../')
+
+from forwarding_table import ForwardingTableReader, ForwardingTableWriter
+from packet import RIPPacket
+from prefix_trie import PrefixTrie, length_to_mask
+from router import Router, RouteInfo
+
+ROUTER_FILENAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "router.py")
+EXAMPLES_DIR = os.path.join(os.path.dirname(ROUTER_FILENAME), "configurations")
+DEFAULT_BASELINE_FILENAME = "benchmark-baseline.json"
+DEFAULT_THRESHOLD = 0.25
+REPEATS = 5  # Each benchmark is run this many times, and the fastest run is kept.
+MIN_RUN_TIME = 0.05  # Each run repeats its operation until at least this many seconds have passed.
+
+ROUTER_ID = 1
+FIRST_DESTINATION_ID = 1000
+FIRST_OUTPUT_PORT = 60000
+NUM_PREFIXES = 100000
+NUM_PREFIX_LOOKUPS = 1000
+
+benchmarks = []  # List of (name, function) pairs. Functions return seconds per operation.
+
+
+def benchmark(*names):
+    """ Register a benchmark function under one or more names, passing each name's arguments to the function. """
+    def register(function):
+        for name, args in names:
+            benchmarks.append((name, lambda args=args: function(*args)))
+        return function
+    return register
+
+
+def measure(operation, setup=None, per=1):
+    """ Time an operation, run after an optional untimed setup. Return the fastest time taken, divided by 'per'. """
+    best = None
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # As timeit does, so that collections triggered by earlier benchmarks do not skew this one.
+    try:
+        for _ in range(REPEATS):
+            elapsed = 0
+            runs = 0
+            while elapsed < MIN_RUN_TIME:
+                state = setup() if setup else None
+                start = time.perf_counter()
+                operation(state)
+                elapsed += time.perf_counter() - start
+                runs += 1
+            elapsed /= runs
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best / per
+
+
+def make_router(num_neighbours=1):
+    """ Create a quiet router with the given number of neighbours, with router ids 2 and up. """
+    config_lines = [
+        "router-id " + str(ROUTER_ID),
+        "input-ports 59999",
+        "outputs " + ", ".join(
+            "{}/1/{}".format(FIRST_OUTPUT_PORT + i, i + 2) for i in range(num_neighbours)
+        ),
+        "update-period 30"
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        router = Router(config_lines)
+    router.logging_enabled = False
+    router.config_dir = "benchmark"
+    return router
+
+
+def make_routing_table(num_routes, first_hop=2, cost=5):
+    return {
+        FIRST_DESTINATION_ID + i: RouteInfo(first_hop, cost, 0) for i in range(num_routes)
+    }
+
+
+def make_packet(num_entries, cost=1, from_router_id=2):
+    rip_packet = RIPPacket()
+    rip_packet.from_router_id = from_router_id
+    for i in range(num_entries):
+        rip_packet.add_entry(FIRST_DESTINATION_ID + i, cost)
+    return rip_packet
+
+
+@benchmark(*[("packet.pack[{}]".format(n), (n,)) for n in (1, 25, 1000)])
+def benchmark_pack(num_entries):
+    return measure(lambda rip_packet: rip_packet.pack(), lambda: make_packet(num_entries))
+
+
+@benchmark(*[("packet.unpack[{}]".format(n), (n,)) for n in (1, 25, 1000)])
+def benchmark_unpack(num_entries):
+    byte_data = make_packet(num_entries).pack()
+    return measure(lambda _: RIPPacket(byte_data))
+
+
+@benchmark(*[("packet.validate[{}]".format(n), (n,)) for n in (1, 25, 1000)])
+def benchmark_validate(num_entries):
+    rip_packet = RIPPacket(make_packet(num_entries).pack())
+    return measure(lambda _: rip_packet.validate())
+
+
+@benchmark(*[("router.process_packet.{}[per-entry]".format(kind), (kind,)) for kind in (
+    "new", "unchanged", "improved", "poisoned"
+)])
+def benchmark_process_packet(kind, num_entries=1000):
+    """ Time processing a full packet from neighbour 2, where every entry is of the given kind. """
+    router = make_router(num_neighbours=2)
+    if kind == "new":
+        table, cost = {}, 1
+    elif kind == "unchanged":
+        table, cost = make_routing_table(num_entries, first_hop=2, cost=2), 1
+    elif kind == "improved":
+        table, cost = make_routing_table(num_entries, first_hop=3, cost=10), 1
+    else:
+        table, cost = make_routing_table(num_entries, first_hop=2, cost=2), Router.INFINITY
+    byte_data = make_packet(num_entries, cost).pack()
+
+    def setup():
+        router.routing_table = {router_id: route_info.copy() for router_id, route_info in table.items()}
+        router.index_routing_table()
+        router.triggered_updates = []
+
+    return measure(lambda _: router.process_packet(byte_data, 59999), setup, per=num_entries)
+
+
+@benchmark(*[("router.send_updates[{}-neighbours]".format(n), (n,)) for n in (1, 8, 32)])
+def benchmark_send_updates(num_neighbours, num_routes=25):
+    router = make_router(num_neighbours)
+    router.routing_table = make_routing_table(num_routes)
+    router.index_routing_table()
+    return measure(lambda _: router.send_updates(router.routing_table.keys()))
+
+
+@benchmark(*[("router.update_routing_table_timing[{}]".format(n), (n,)) for n in (1000, 10000)])
+def benchmark_update_routing_table_timing(num_routes):
+    router = make_router()
+    table = make_routing_table(num_routes)
+
+    def setup():
+        router.routing_table = {router_id: route_info.copy() for router_id, route_info in table.items()}
+        router.index_routing_table()
+
+    return measure(lambda _: router.update_routing_table_timing(), setup)
+
+
+@benchmark(*[("router.save_routing_table[{}]".format(n), (n,)) for n in (1000, 10000)])
+def benchmark_save_routing_table(num_routes):
+    router = make_router()
+    router.routing_table = make_routing_table(num_routes)
+    return measure(lambda _: router.save_routing_table())
+
+
+@benchmark(*[("router.initialise_routing_table[{}]".format(n), (n,)) for n in (1000, 10000)])
+def benchmark_initialise_routing_table(num_routes):
+    """ Time loading a saved routing table from router memory. """
+    router = make_router()
+    router.routing_table = make_routing_table(num_routes)
+    router.save_routing_table()
+    router.load = True
+    with contextlib.redirect_stdout(io.StringIO()):
+        return measure(lambda _: router.initialise_routing_table())
+
+
+@benchmark(*[("forwarding_table.publish[{}]".format(n), (n,)) for n in (1000, 10000)])
+def benchmark_forwarding_table_publish(num_routes):
+    router = make_router()
+    router.routing_table = make_routing_table(num_routes)
+    router.forwarding_table_writer = ForwardingTableWriter("forwarding-table.bin", ROUTER_ID)
+    return measure(lambda _: router.publish_routing_table())
+
+
+@benchmark(*[("forwarding_table.lookup[{}]".format(n), (n,)) for n in (1000, 10000)])
+def benchmark_forwarding_table_lookup(num_routes, num_lookups=1000):
+    """ Time a reader looking up routes in a published forwarding table. """
+    writer = ForwardingTableWriter("forwarding-table.bin", ROUTER_ID)
+    writer.publish((router_id, 2, 5) for router_id in make_routing_table(num_routes))
+    reader = ForwardingTableReader("forwarding-table.bin")
+    destinations = [FIRST_DESTINATION_ID + (i * 7919) % num_routes for i in range(num_lookups)]
+
+    def lookup(_):
+        for destination in destinations:
+            reader.lookup(destination)
+
+    return measure(lookup, per=num_lookups)
+
+
+class LinearPrefixTable:
+    """ Baseline for the prefix trie: every prefix is checked on every lookup. """
+    def __init__(self):
+        self.prefixes = {}  # Map (address, length) pairs to values.
+
+    def insert(self, address, length, value):
+        self.prefixes[(address, length)] = value
+
+    def remove(self, address, length):
+        return self.prefixes.pop((address, length), None)
+
+    def lookup(self, address):
+        best, best_length = None, -1
+        for (prefix_address, length), value in self.prefixes.items():
+            if length > best_length and address & length_to_mask(length) == prefix_address:
+                best, best_length = value, length
+        return best
+
+
+class DictPerLengthPrefixTable:
+    """ Baseline for the prefix trie: a dictionary per prefix length, tried from the longest length down. """
+    def __init__(self):
+        self.tables = {}  # Map prefix lengths to maps of addresses to values.
+        self.lengths = []  # Prefix lengths in use, longest first.
+
+    def insert(self, address, length, value):
+        if length not in self.tables:
+            self.tables[length] = {}
+            self.lengths = sorted(self.tables, reverse=True)
+        self.tables[length][address] = value
+
+    def remove(self, address, length):
+        return self.tables.get(length, {}).pop(address, None)
+
+    def lookup(self, address):
+        for length in self.lengths:
+            value = self.tables[length].get(address & length_to_mask(length))
+            if value is not None:
+                return value
+        return None
+
+
+PREFIX_TABLES = {"prefix_trie": PrefixTrie, "prefix_dict_per_length": DictPerLengthPrefixTable}
+
+
+def make_prefixes(num_prefixes, seed=1):
+    """ Generate random prefixes, with lengths distributed roughly as in an internet routing table. """
+    rng = random.Random(seed)
+    lengths = [24] * 60 + list(range(16, 24)) * 4 + list(range(8, 16)) + list(range(25, 33))
+    prefixes = set()
+    while len(prefixes) < num_prefixes:
+        length = rng.choice(lengths)
+        prefixes.add((rng.getrandbits(32) & length_to_mask(length), length))
+    return sorted(prefixes)
+
+
+def make_prefix_table(table_type, prefixes):
+    table = table_type()
+    for address, length in prefixes:
+        table.insert(address, length, (address, length))
+    return table
+
+
+def make_prefix_lookups(prefixes, num_lookups, seed=2):
+    """ Generate addresses to look up, half inside random prefixes of the table and half anywhere. """
+    rng = random.Random(seed)
+    addresses = []
+    for i in range(num_lookups):
+        address, length = rng.choice(prefixes)
+        addresses.append(address | (rng.getrandbits(32) & ~length_to_mask(length)) if i % 2 else rng.getrandbits(32))
+    return addresses
+
+
+@benchmark(*[
+    ("{}.lookup[{}]".format(name, NUM_PREFIXES), (table_type,)) for name, table_type in list(PREFIX_TABLES.items()) + [
+        ("prefix_linear", LinearPrefixTable)
+    ]
+])
+def benchmark_prefix_lookup(table_type):
+    prefixes = make_prefixes(NUM_PREFIXES)
+    table = make_prefix_table(table_type, prefixes)
+    # The linear table takes milliseconds per lookup, so only time a few.
+    addresses = make_prefix_lookups(prefixes, 10 if table_type is LinearPrefixTable else NUM_PREFIX_LOOKUPS)
+
+    def lookup(_):
+        for address in addresses:
+            table.lookup(address)
+
+    return measure(lookup, per=len(addresses))
+
+
+@benchmark(("prefix_trie.lookup_many[{}]".format(NUM_PREFIXES), ()))
+def benchmark_prefix_trie_lookup_many():
+    prefixes = make_prefixes(NUM_PREFIXES)
+    trie = make_prefix_table(PrefixTrie, prefixes)
+    addresses = make_prefix_lookups(prefixes, NUM_PREFIX_LOOKUPS)
+    return measure(lambda _: trie.lookup_many(addresses), per=len(addresses))
+
+
+@benchmark(*[
+    ("{}.update[{}]".format(name, NUM_PREFIXES), (table_type,)) for name, table_type in list(PREFIX_TABLES.items()) + [
+        ("prefix_linear", LinearPrefixTable)
+    ]
+])
+def benchmark_prefix_update(table_type):
+    """ Time removing then re-inserting prefixes, as when routes are withdrawn and re-advertised. """
+    prefixes = make_prefixes(NUM_PREFIXES)
+    table = make_prefix_table(table_type, prefixes)
+    updates = random.Random(3).sample(prefixes, NUM_PREFIX_LOOKUPS)
+
+    def update(_):
+        for address, length in updates:
+            table.remove(address, length)
+        for address, length in updates:
+            table.insert(address, length, (address, length))
+
+    return measure(update, per=len(updates) * 2)
+
+
+def copy_example(example_num, work_dir):
+    """ Copy the configs of an example network into a working directory. Return the directory they were copied to. """
+    config_dir = os.path.join(work_dir, "configurations")
+    os.makedirs(config_dir)
+    for config_filename in glob.glob(os.path.join(EXAMPLES_DIR, "example-" + example_num, "example-*-config-*.txt")):
+        shutil.copy(config_filename, config_dir)
+    return config_dir
+
+
+def start_router(config_filename, work_dir, options=("events",), stdout=subprocess.DEVNULL):
+    """ Start a router process for a config file, in a working directory. """
+    return subprocess.Popen(
+        [sys.executable, ROUTER_FILENAME, config_filename] + list(options),
+        cwd=work_dir, stdout=stdout, stderr=subprocess.DEVNULL, universal_newlines=True
+    )
+
+
+def stop_processes(processes):
+    """ Stop processes, killing any that have not stopped within 10 seconds. """
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+@contextlib.contextmanager
+def start_routers(config_dir, extra_settings=None, work_dir=None, options=("events",), stdout=subprocess.DEVNULL):
+    """
+    Run a router for every config file in a directory, from a working directory (the config directory's parent by
+    default), and stop them all on leaving the context. Any extra settings are added to every config file first.
+    Yields a map of router ids to their processes.
+    """
+    work_dir = os.path.dirname(config_dir) if work_dir is None else work_dir
+    # Record the config directory as the last one opened, otherwise every router starting at once sees a different
+    # config directory and races to clear the others' router memory.
+    os.makedirs(os.path.join(work_dir, "router-memory"), exist_ok=True)
+    with open(os.path.join(work_dir, "router-memory", "last-config-dir"), "w") as last_config_dir:
+        last_config_dir.write(config_dir)
+
+    processes = {}
+    try:
+        for config_filename in sorted(glob.glob(os.path.join(config_dir, "*config-*.txt"))):
+            router_id = int(re.search("config-([0-9]+).txt", config_filename).group(1))
+            if extra_settings:
+                with open(config_filename, "a") as config_file:
+                    config_file.write("".join("\n{} {}".format(*item) for item in extra_settings.items()) + "\n")
+            processes[router_id] = start_router(config_filename, work_dir, options, stdout)
+        yield processes
+    finally:
+        stop_processes(list(processes.values()))
+
+
+def run_benchmarks(name_filter=""):
+    results = {}
+    for name, function in benchmarks:
+        if name_filter not in name:
+            continue
+        results[name] = function() * 1e6
+        print("{:55} {:12.3f} us".format(name, results[name]))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Print the change of each result from its baseline. Return the names of any results that have regressed. """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print("{:55} {:>12}".format(name, "new"))
+            continue
+        change = (result - baseline[name]) / baseline[name]
+        regressed = change > threshold
+        print("{:55} {:+11.1f}% {}".format(name, change * 100, "REGRESSED" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    mode = args.pop(0) if args and args[0] in ("run", "save", "compare") else "run"
+    baseline_filename = os.path.abspath(args.pop(0) if args and mode != "run" else DEFAULT_BASELINE_FILENAME)
+    threshold = float(options.get("threshold", DEFAULT_THRESHOLD))
+    name_filter = args.pop(0) if args else ""
+
+    # Routers write their memory to the working directory, so keep it out of the repository.
+    os.chdir(tempfile.mkdtemp(prefix="benchmarks-"))
+    results = run_benchmarks(name_filter)
+
+    if mode == "save":
+        with open(baseline_filename, "w+") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+        print("Saved baseline to", baseline_filename)
+    elif mode == "compare":
+        with open(baseline_filename) as baseline_file:
+            baseline = json.load(baseline_file)
+        print("\nCompared to", baseline_filename, "(threshold {:.0f}%):".format(threshold * 100))
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print("\n{} benchmark(s) regressed: {}".format(len(regressions), ", ".join(regressions)))
+            exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Run every router of an example network on this machine and measure how long it takes to converge.
+
+Usage (from the scripts directory):
+    python convergence_benchmark.py <example-num> [timeout-seconds] [restart=<router-id>] [router options...]
+
+The timeout is 120 seconds by default. With restart=<router-id> (given anywhere after the example number), once the
+network has converged the given router is stopped and started again, and the time it takes to get back a full
+(expected) routing table is measured as well.
+
+Routers run in a temporary working directory, so their logs and memory do not touch the repository. If the example
+has an impairments file (see impairment_proxy.py), the impairment proxy is run alongside the routers.
+"""
+
+import glob
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import EXAMPLES_DIR, start_router, start_routers, stop_processes
+from impairment_proxy import IMPAIRMENTS_FILENAME
+
+DEFAULT_TIMEOUT = 120
+CONVERGED_MESSAGE = "== Routing table matches expected routing table =="
+PACKET_LOG_MESSAGE = "Processing routing update packet from router"
+
+
+def read_output(router_id, process, start, converged_times):
+    """ Record the first time a router reports its routing table matches the expected routing table. """
+    for line in process.stdout:
+        if CONVERGED_MESSAGE in line and router_id not in converged_times:
+            converged_times[router_id] = time.time() - start
+
+
+def count_packets(log_dir):
+    """ Count the routing update packets each router processed, from its log file. """
+    counts = {}
+    for log_filename in glob.glob(os.path.join(log_dir, "log-*.txt")):
+        router_id = int(re.search("log-([0-9]+).txt", log_filename).group(1))
+        with open(log_filename) as log_file:
+            counts[router_id] = sum(line.count(PACKET_LOG_MESSAGE) for line in log_file)
+    return counts
+
+
+def watch_output(router_id, process, start, converged_times):
+    """ Record when a router process converges in converged_times, from a background thread. """
+    threading.Thread(target=read_output, args=(router_id, process, start, converged_times), daemon=True).start()
+
+
+def run_example(example_num, timeout=DEFAULT_TIMEOUT, options=(), restart_router_id=None):
+    """
+    Run all routers of an example until they have all converged, or timed out. If a router id to restart is given,
+    then restart that router once converged, and run until it has converged again. Return the results.
+    """
+    example_path = os.path.join(EXAMPLES_DIR, "example-" + example_num)
+    work_dir = tempfile.mkdtemp(prefix="convergence-")
+
+    proxy = None
+    impairments_filename = os.path.join(example_path, IMPAIRMENTS_FILENAME)
+    if os.path.isfile(impairments_filename):
+        proxy = subprocess.Popen(
+            [sys.executable, os.path.abspath("impairment_proxy.py"), "run", impairments_filename],
+            stdout=subprocess.DEVNULL
+        )
+
+    converged_times = {}
+    restart_time = None
+    start = time.time()
+    with start_routers(example_path, work_dir=work_dir, options=options, stdout=subprocess.PIPE) as processes:
+        for router_id, process in processes.items():
+            watch_output(router_id, process, start, converged_times)
+        while len(converged_times) < len(processes) and time.time() - start < timeout:
+            time.sleep(0.1)
+        elapsed = time.time() - start
+
+        if restart_router_id is not None and len(converged_times) == len(processes):
+            stop_processes([processes[restart_router_id]])
+            restart_converged_times = {}
+            restart_start = time.time()
+            config_filename = os.path.join(
+                example_path, "example-{}-config-{}.txt".format(example_num, restart_router_id)
+            )
+            # Replace the stopped process, so that the restarted router is stopped on leaving the context too.
+            processes[restart_router_id] = start_router(config_filename, work_dir, options, subprocess.PIPE)
+            watch_output(restart_router_id, processes[restart_router_id], restart_start, restart_converged_times)
+            while not restart_converged_times and time.time() - restart_start < timeout:
+                time.sleep(0.01)
+            restart_time = restart_converged_times.get(restart_router_id)
+
+    if proxy:
+        stop_processes([proxy])
+
+    return {
+        "routers": len(processes),
+        "converged": len(converged_times),
+        "convergence_time": max(converged_times.values()) if len(converged_times) == len(processes) else None,
+        "elapsed": elapsed,
+        "converged_times": converged_times,
+        "restart_time": restart_time,
+        "packets": count_packets(os.path.join(work_dir, "logs")),
+        "work_dir": work_dir,
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        return
+    example_num = args[0]
+    # Keyword arguments can be given anywhere, so take them out before looking for the timeout.
+    settings = dict(arg.split("=", 1) for arg in args[1:] if "=" in arg)
+    options = [arg for arg in args[1:] if "=" not in arg]
+    timeout = DEFAULT_TIMEOUT
+    if options and re.fullmatch("[0-9]+(\\.[0-9]*)?", options[0]):
+        timeout = float(options.pop(0))
+    restart_router_id = int(settings["restart"]) if "restart" in settings else None
+    results = run_example(example_num, timeout, options, restart_router_id)
+
+    print("Routers converged: {}/{}".format(results["converged"], results["routers"]))
+    for router_id, converged_time in sorted(results["converged_times"].items()):
+        print("Router {}: {:.2f}s".format(router_id, converged_time))
+    if results["convergence_time"] is not None:
+        print("Network converged in {:.2f}s".format(results["convergence_time"]))
+    else:
+        print("Network did not converge within {:.2f}s".format(results["elapsed"]))
+    if restart_router_id is not None:
+        if results["restart_time"] is not None:
+            print("Router {} converged again {:.2f}s after restarting".format(
+                restart_router_id, results["restart_time"]
+            ))
+        else:
+            print("Router {} did not converge again after restarting".format(restart_router_id))
+    total_packets = sum(results["packets"].values())
+    print("Update packets processed: {} ({:.1f}/s)".format(total_packets, total_packets / results["elapsed"]))
+    print("Logs and router memory kept in", results["work_dir"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure counting to infinity after a router fails, with and without extra config settings (such as hold-down).
+
+Usage (from the scripts directory):
+    python count_to_infinity_benchmark.py <example-num> <router-id> [options...] [<setting>=<value>...]
+
+Options:
+    settle=<seconds>    How long to let the network converge before stopping the router, 45 seconds by default.
+    after=<seconds>     How long to keep running after stopping the router, 90 seconds by default.
+
+Every router of the example is run with its event log, then the given router is killed, and the network is left to
+reconverge. This is done twice: with the example's configs as they are, then with each given setting added to every
+config, such as 'hold-down=15 count-to-infinity-threshold=3'. The events after the router was killed are analysed
+with analyze_events.py, to compare how long the failure took to detect, the counting to infinity, route changes and
+updates sent.
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from analyze_events import Analyzer, merge_events
+from benchmarks import copy_example, start_routers
+
+DEFAULT_SETTLE = 45
+DEFAULT_AFTER = 90
+
+
+def run_failure(example_num, victim_id, settings, settle, after):
+    """ Run an example with the given settings added to its configs, killing a router once settled. """
+    work_dir = tempfile.mkdtemp(prefix="count-to-infinity-")
+    with start_routers(copy_example(example_num, work_dir), settings) as processes:
+        time.sleep(settle)
+        failure_time = time.monotonic()
+        processes[victim_id].kill()
+        time.sleep(after)
+        end_time = time.monotonic()
+
+    # Only analyse what happened after the failure, not the routers withdrawing their routes as they are stopped.
+    analyzer = Analyzer()
+    counts = dict.fromkeys(("packets sent", "entries sent", "route changes"), 0)
+    first_change_time = last_change_time = None
+    for event in merge_events(glob.glob(os.path.join(work_dir, "logs", "events-*.jsonl"))):
+        if not failure_time <= event["time"] < end_time:
+            continue
+        analyzer.process(event)
+        if event["event"] == "send":
+            counts["packets sent"] += 1
+            counts["entries sent"] += event["entries"]
+        elif event["event"] in ("route", "delete"):
+            counts["route changes"] += event["event"] == "route"
+            # Routes being deleted long after becoming unreachable is garbage collection, not reconvergence.
+            if event["event"] == "route":
+                first_change_time = event["time"] if first_change_time is None else first_change_time
+                last_change_time = event["time"]
+    analyzer.finish()
+
+    counts["counting episodes"] = analyzer.count_to_infinity_episodes
+    counts["counting increases"] = analyzer.count_to_infinity_increases
+    counts["counting seconds"] = analyzer.count_to_infinity_time
+    counts["hold-downs"] = analyzer.hold_downs
+    counts["detected and poisoned"] = analyzer.count_to_infinity_detections
+    # Neighbours only notice the failure once their routes through the router time out (or it misses enough hellos),
+    # so reconvergence is timed from the first route change.
+    counts["detection seconds"] = first_change_time - failure_time if first_change_time is not None else 0
+    counts["reconvergence seconds"] = last_change_time - first_change_time if first_change_time is not None else 0
+    return counts, work_dir
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print(__doc__)
+        return
+    example_num, victim_id = args[0], int(args[1])
+    options = dict(arg.split("=", 1) for arg in args[2:] if "=" in arg)
+    settle = float(options.pop("settle", DEFAULT_SETTLE))
+    after = float(options.pop("after", DEFAULT_AFTER))
+
+    results = {}
+    for name, settings in (("without", {}), ("with", options)):
+        print("Running example", example_num, "with", ", ".join("{} {}".format(*item) for item in settings.items()) or
+              "its configs as they are", "and killing router", victim_id, "after", settle, "seconds")
+        results[name], work_dir = run_failure(example_num, victim_id, settings, settle, after)
+        print("Logs kept in", work_dir)
+
+    print("\n{:24} {:>12} {:>12}".format("After the failure", "Without", "With"))
+    for name in results["without"]:
+        print("{:24} {:>12.1f} {:>12.1f}".format(name, results["without"][name], results["with"][name]))
+
+
+if __name__ == "__main__":
+    main()
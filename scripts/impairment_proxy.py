@@ -0,0 +1,215 @@
+"""
+UDP proxy that sits between routers' output ports and their neighbours' input ports, impairing the traffic on each link.
+
+Usage (from the scripts directory):
+    python impairment_proxy.py setup <example-num> [base-port]
+        Copy an example to example-<num>-impaired, with every output redirected through a proxy port, and write an
+        impairments file describing each link (unimpaired by default).
+    python impairment_proxy.py run <impairments-file>
+        Run the proxy described by an impairments file.
+
+Impairments file format (lines starting with '#' are ignored):
+    seed 42
+    default loss=0.1 delay=20
+    link <proxy-port>/<router-port> [loss=<0-1>] [delay=<ms>] [jitter=<ms>] [duplicate=<0-1>] [reorder=<0-1>]
+    down <proxy-port> <start-seconds> <end-seconds>
+"""
+
+import heapq
+import os
+import random
+import re
+import shutil
+import sys
+import time
+from select import select
+from socket import socket, AF_INET, SOCK_DGRAM
+
+IMPAIRMENTS_FILENAME = "impairments.txt"
+DEFAULT_BASE_PORT = 20000
+REORDER_HOLD = 0.05  # Extra seconds a packet selected for reordering is held back, so later packets overtake it.
+STATS_PERIOD = 10  # How often in seconds link statistics are printed.
+READ_TIMEOUT = 1
+
+
+class Link:
+    IMPAIRMENTS = ("loss", "delay", "jitter", "duplicate", "reorder")
+
+    def __init__(self, proxy_port, router_port, impairments):
+        self.proxy_port = proxy_port
+        self.router_port = router_port
+        self.loss = impairments.get("loss", 0)
+        self.delay = impairments.get("delay", 0) / 1000
+        self.jitter = impairments.get("jitter", 0) / 1000
+        self.duplicate = impairments.get("duplicate", 0)
+        self.reorder = impairments.get("reorder", 0)
+        self.down_periods = []  # List of (start, end) times, in seconds since the proxy started.
+        self.stats = {"received": 0, "dropped": 0, "duplicated": 0, "reordered": 0, "forwarded": 0}
+
+    def is_down(self, elapsed):
+        return any(start <= elapsed < end for start, end in self.down_periods)
+
+
+def parse_impairments(parts, line_number):
+    """ Parse 'name=value' impairment settings. """
+    impairments = {}
+    for part in parts:
+        name, _, value = part.partition("=")
+        if name not in Link.IMPAIRMENTS:
+            raise ValueError("Unknown impairment '" + name + "' on line " + str(line_number))
+        try:
+            impairments[name] = float(value)
+        except ValueError:
+            raise ValueError("Invalid value for '" + name + "' on line " + str(line_number))
+    return impairments
+
+
+def load_impairments(lines):
+    """ Build the links described by the lines of an impairments file. Return the links (by proxy port) and seed. """
+    links = {}
+    defaults = {}
+    seed = None
+    for line_number, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts or parts[0][0] == "#":
+            continue
+        if parts[0] == "seed":
+            seed = int(parts[1])
+        elif parts[0] == "default":
+            defaults = parse_impairments(parts[1:], line_number)
+        elif parts[0] == "link":
+            proxy_port, router_port = map(int, parts[1].split("/"))
+            impairments = dict(defaults)
+            impairments.update(parse_impairments(parts[2:], line_number))
+            links[proxy_port] = Link(proxy_port, router_port, impairments)
+        elif parts[0] == "down":
+            links[int(parts[1])].down_periods.append((float(parts[2]), float(parts[3])))
+        else:
+            raise ValueError("Unknown setting '" + parts[0] + "' on line " + str(line_number))
+    return links, seed
+
+
+def print_stats(links):
+    for proxy_port, link in sorted(links.items()):
+        print("{} -> {}: {}".format(
+            proxy_port, link.router_port, ", ".join(name + "=" + str(count) for name, count in link.stats.items())
+        ))
+
+
+def run(impairments_filename):
+    with open(impairments_filename) as impairments_file:
+        links, seed = load_impairments(impairments_file.readlines())
+    rand = random.Random(seed)
+
+    sockets = {}
+    for proxy_port in links:
+        a_socket = socket(AF_INET, SOCK_DGRAM)
+        a_socket.bind(("localhost", proxy_port))
+        sockets[a_socket] = links[proxy_port]
+    output_socket = socket(AF_INET, SOCK_DGRAM)
+    print("Proxying", len(links), "links")
+
+    queue = []  # Heap of (delivery time, sequence number, link, data).
+    sequence = 0
+    start = time.time()
+    last_stats = start
+    try:
+        while True:
+            now = time.time()
+            timeout = min(READ_TIMEOUT, max(0, queue[0][0] - now)) if queue else READ_TIMEOUT
+            for a_socket in select(sockets.keys(), [], [], timeout)[0]:
+                link = sockets[a_socket]
+                data = a_socket.recv(65535)
+                now = time.time()
+                link.stats["received"] += 1
+                if link.is_down(now - start) or rand.random() < link.loss:
+                    link.stats["dropped"] += 1
+                    continue
+                copies = 1
+                if rand.random() < link.duplicate:
+                    link.stats["duplicated"] += 1
+                    copies = 2
+                for _ in range(copies):
+                    delivery_time = now + max(0, link.delay + rand.uniform(-link.jitter, link.jitter))
+                    if rand.random() < link.reorder:
+                        link.stats["reordered"] += 1
+                        delivery_time += REORDER_HOLD
+                    heapq.heappush(queue, (delivery_time, sequence, link, data))
+                    sequence += 1
+
+            # Deliver any packets whose delay has passed.
+            now = time.time()
+            while queue and queue[0][0] <= now:
+                _, _, link, data = heapq.heappop(queue)
+                output_socket.sendto(data, ("localhost", link.router_port))
+                link.stats["forwarded"] += 1
+
+            if now - last_stats >= STATS_PERIOD:
+                print_stats(links)
+                last_stats = now
+    except KeyboardInterrupt:
+        print_stats(links)
+
+
+def setup(example_num, base_port=DEFAULT_BASE_PORT):
+    """ Create an impaired copy of an example, with every output going through a proxy port. """
+    example_path = "../configurations/example-" + example_num + "/"
+    impaired_num = example_num + "-impaired"
+    impaired_path = "../configurations/example-" + impaired_num + "/"
+    if os.path.isdir(impaired_path):
+        confirm = input(
+            "Example {} already exists. Enter 'y' to confirm overwrite: ".format(impaired_num)
+        ).strip().lower()
+        if confirm != "y":
+            exit()
+        shutil.rmtree(impaired_path)
+    os.makedirs(impaired_path)
+    if os.path.isdir(example_path + "converged-routing-tables"):
+        shutil.copytree(example_path + "converged-routing-tables", impaired_path + "converged-routing-tables")
+
+    match_regex = re.compile("example-" + example_num + "-config-([0-9]+).txt")
+    link_lines = []
+    proxy_port = base_port
+    for config_file_name in sorted(os.listdir(example_path)):
+        match = re.match(match_regex, config_file_name)
+        if not match:
+            continue
+        with open(example_path + config_file_name) as config_file:
+            lines = config_file.readlines()
+        new_lines = []
+        for line in lines:
+            if line.split(" ")[0] != "outputs":
+                new_lines.append(line)
+                continue
+            outputs = []
+            for output in " ".join(line.split()).split(" ", 1)[1].split(","):
+                router_port, cost, router_id = output.strip().split("/")
+                outputs.append("{}/{}/{}".format(proxy_port, cost, router_id))
+                link_lines.append("link {}/{}".format(proxy_port, router_port.strip()))
+                proxy_port += 1
+            new_lines.append("outputs " + ", ".join(outputs) + ("\n" if line.endswith("\n") else ""))
+        impaired_file_name = "example-" + impaired_num + "-config-" + match.group(1) + ".txt"
+        with open(impaired_path + impaired_file_name, "w+") as impaired_file:
+            impaired_file.writelines(new_lines)
+
+    with open(impaired_path + IMPAIRMENTS_FILENAME, "w+") as impairments_file:
+        impairments_file.write("# default loss=0.1 delay=20 jitter=5 duplicate=0.01 reorder=0.01\n")
+        impairments_file.write("# down <proxy-port> <start-seconds> <end-seconds>\n")
+        impairments_file.write("\n".join(link_lines) + "\n")
+    print("Created example", impaired_num, "with", len(link_lines), "proxied links")
+    print("Edit", impaired_path + IMPAIRMENTS_FILENAME, "to impair them, then run:")
+    print("python impairment_proxy.py run", impaired_path + IMPAIRMENTS_FILENAME)
+
+
+def main():
+    args = sys.argv
+    if len(args) >= 3 and args[1] == "setup":
+        setup(args[2], int(args[3]) if len(args) >= 4 else DEFAULT_BASE_PORT)
+    elif len(args) >= 3 and args[1] == "run":
+        run(args[2])
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Measure the lookup throughput of a router's query service (see the 'query-port' config setting).
+
+Usage (from the scripts directory):
+    python query_benchmark.py [port] [options...]
+
+Options:
+    lookups=<n>      Number of route lookups to make per client, 100000 by default.
+    batch=<n>        Number of destinations per 'route' query, 1 by default.
+    pipeline=<n>     Number of queries sent before reading their answers, 100 by default.
+    clients=<n>      Number of concurrent client connections, 1 by default.
+    routes=<n>       Size of the routing table of the router started when no port is given, 1000 by default.
+
+If no port is given, a router with a generated routing table is started in a separate process, republishing its
+snapshot every PUBLISH_INTERVAL seconds, as a router processing updates would. Its process is stopped afterwards.
+"""
+
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append('../')
+
+from router import Router, RouteInfo
+
+DEFAULT_PORT = 59000
+PUBLISH_INTERVAL = 0.1
+FIRST_DESTINATION_ID = 1000
+
+
+def serve(port, num_routes):
+    """ Run a quiet router's query service with a generated routing table, republishing it continually. """
+    # Routers write their logs to the working directory, so keep them out of the repository.
+    os.chdir(tempfile.mkdtemp(prefix="query-benchmark-"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        router = Router(["router-id 1", "input-ports 59999", "outputs 60000/1/2", "query-port " + str(port)])
+    router.logging_enabled = False
+    router.routing_table = {FIRST_DESTINATION_ID + i: RouteInfo(2, 5, 0) for i in range(num_routes)}
+    router.index_routing_table()
+    router.start_query_server()
+    while True:
+        time.sleep(PUBLISH_INTERVAL)
+        router.publish_routing_table()
+
+
+def wait_for_server(port, timeout=10):
+    start = time.time()
+    while time.time() - start < timeout:
+        try:
+            socket.create_connection(("localhost", port)).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def read_lines(a_file, count):
+    for _ in range(count):
+        if not a_file.readline():
+            raise ConnectionError("Query service closed the connection")
+
+
+def run_client(port, lookups, batch, pipeline, destination_ids, results):
+    """ Make route lookups, with pipelined queries. Append the number of lookups made and time taken to results. """
+    connection = socket.create_connection(("localhost", port))
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    answers = connection.makefile("rb")
+    queries_per_round = pipeline
+    lookups_per_round = queries_per_round * batch
+    rounds = max(1, lookups // lookups_per_round)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        queries = b"".join(
+            ("route " + " ".join(random.choices(destination_ids, k=batch)) + "\n").encode()
+            for _ in range(queries_per_round)
+        )
+        connection.sendall(queries)
+        read_lines(answers, lookups_per_round)
+    results.append((rounds * lookups_per_round, time.perf_counter() - start))
+    connection.close()
+
+
+def main():
+    args = sys.argv[1:]
+    port = int(args.pop(0)) if args and args[0].isdigit() else None
+    options = dict(arg.split("=") for arg in args if "=" in arg)
+    lookups = int(options.get("lookups", 100000))
+    batch = int(options.get("batch", 1))
+    pipeline = int(options.get("pipeline", 100))
+    clients = int(options.get("clients", 1))
+    num_routes = int(options.get("routes", 1000))
+
+    server_process = None
+    if port is None:
+        port = DEFAULT_PORT
+        server_process = multiprocessing.Process(target=serve, args=(port, num_routes), daemon=True)
+        server_process.start()
+    if not wait_for_server(port):
+        print("Could not connect to a query service on port", port)
+        exit(1)
+
+    # Look up destinations the router has a route to, so the answers are realistic.
+    with socket.create_connection(("localhost", port)) as connection:
+        connection.sendall(b"table\n")
+        table_answer = connection.makefile("rb").readline()
+    destination_ids = list(json.loads(table_answer)["routes"]) or ["1"]
+
+    results = []
+    threads = [
+        threading.Thread(target=run_client, args=(port, lookups, batch, pipeline, destination_ids, results))
+        for _ in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if server_process:
+        server_process.terminate()
+
+    total_lookups = sum(count for count, _ in results)
+    print("{} lookups of {} routes, {} per query, {} queries pipelined, {} client(s)".format(
+        total_lookups, len(destination_ids), batch, pipeline, clients
+    ))
+    print("{:.0f} lookups/s in {:.3f}s".format(total_lookups / elapsed, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Replay a packet capture (recorded by running a router with the 'capture' option) into a router, offline.
+
+Usage (from the scripts directory):
+    python replay_capture.py <config-file> <capture-file> [options...]
+
+Options:
+    realtime    Replay with the capture's original timing, instead of as fast as possible.
+    log         Write the router's log file, as a running router would. Disabled by default, so that the
+                measured throughput is that of the update-processing path.
+    verbose     Print the routing table after every replayed packet.
+    repeat=<n>  Replay the capture n times.
+
+The router is created in a temporary working directory, so its logs and memory do not touch the repository. It builds
+the updates and requests it would send, but never sends them, so the replay cannot reach a network running on the same
+host, and its timing does not depend on the sockets.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append('../')
+
+from capture import read_capture
+from packet import HelloPacket, RIPPacket
+from router import Router
+
+
+def replay(router, records, realtime=False, verbose=False):
+    """ Feed captured records into a router. Return the number of packets and entries processed, and the time taken. """
+    header_size = RIPPacket().header_size
+    entry_size = RIPPacket().entry_size
+    packets = 0
+    entries = 0
+    start = time.perf_counter()
+    first_timestamp = records[0][0] if records else 0
+    for timestamp, input_port, data in records:
+        if realtime:
+            delay = (timestamp - first_timestamp) - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        # Hellos only show neighbours are alive, so are not part of the update-processing path being replayed.
+        if HelloPacket.is_hello(data):
+            continue
+        router.process_packet(data, input_port)
+        packets += 1
+        entries += max(0, (len(data) - header_size) // entry_size)
+        if verbose:
+            print(router.get_string_routing_table())
+    return packets, entries, time.perf_counter() - start
+
+
+def main():
+    args = sys.argv
+    if len(args) < 3:
+        print(__doc__)
+        return
+    config_filename = os.path.abspath(args[1])
+    capture_filename = os.path.abspath(args[2])
+    options = args[3:]
+    repeat = 1
+    for option in options:
+        if option.startswith("repeat="):
+            repeat = int(option.split("=")[1])
+
+    captured_router_id, records = read_capture(capture_filename)
+    print("Loaded", len(records), "packets captured by router", captured_router_id)
+
+    with open(config_filename) as config_file:
+        config_lines = config_file.readlines()
+    os.chdir(tempfile.mkdtemp(prefix="replay-"))
+    router = Router(config_lines)
+    if router.id != captured_router_id:
+        print("Warning: capture was recorded by router", captured_router_id, "but the config is for router", router.id)
+    router.config_dir = os.path.dirname(config_filename)
+    router.logging_enabled = "log" in options
+    router.dry_run = True
+    router.initialise_routing_table()
+
+    total_packets = 0
+    total_entries = 0
+    total_time = 0
+    for _ in range(repeat):
+        packets, entries, elapsed = replay(router, records, "realtime" in options, "verbose" in options)
+        total_packets += packets
+        total_entries += entries
+        total_time += elapsed
+
+    print(router.get_string_routing_table())
+    print("Replayed {} packets ({} entries) in {:.3f}s".format(total_packets, total_entries, total_time))
+    if total_time > 0:
+        print("{:.0f} packets/s, {:.0f} entries/s".format(total_packets / total_time, total_entries / total_time))
+    print("Router working directory:", os.getcwd())
+
+
+if __name__ == "__main__":
+    main()
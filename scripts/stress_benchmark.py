@@ -0,0 +1,119 @@
+"""
+Stress a generated network with large routing tables, and measure the updates lost, with and without extra config
+settings (such as receive-buffer and send-pacing).
+
+Usage (from the scripts directory):
+    python stress_benchmark.py [options...] [<setting>=<value>...]
+
+Options:
+    routers=<n>     Number of routers, up to 250, 8 by default.
+    prefixes=<n>    Number of /24 prefixes each router originates, up to 256, 100 by default.
+    settle=<s>      How long to let the network converge before measuring, 15 seconds by default.
+    duration=<s>    How long to measure for, in each mode, 30 seconds by default.
+    seed=<n>        Seed of the generated topology, 1 by default.
+
+Uses the topology of summarization_benchmark.py, with an update period of 2 seconds, so that every router sends its
+whole table, split over many packets, to every neighbour every 2 seconds. This is done twice: with the generated
+configs as they are, then with each given setting added to every config, such as 'receive-buffer=1048576
+send-pacing=2'. Once settled, datagrams dropped by the kernel are counted from /proc/net/udp (so only on Linux). Routes
+lost (set to infinity) while measuring and routes missing from the final routing tables show updates that were lost.
+"""
+
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append('../')
+
+from analyze_events import merge_events
+from benchmarks import start_routers
+from router import read_udp_drops
+from summarization_benchmark import FIRST_PORT, make_topology, write_configs
+
+INFINITY = 16
+
+
+def run_stress(links, num_prefixes, settings, settle, duration):
+    """ Run the routers of a topology with the given settings added to their configs, measuring the updates lost. """
+    work_dir = tempfile.mkdtemp(prefix="stress-")
+    config_dir = os.path.join(work_dir, "configurations")
+    write_configs(config_dir, links, num_prefixes, False)
+    with start_routers(config_dir, settings):
+        time.sleep(settle)
+        start_time = time.monotonic()
+        start_drops = read_udp_drops()
+        time.sleep(duration)
+        end_time = time.monotonic()
+        # Read the kernel's drop counters and the routing tables before the routers are stopped, while their sockets
+        # still exist, and before they withdraw their routes from each other.
+        end_drops = read_udp_drops()
+        routing_tables = read_routing_tables(work_dir)
+
+    counts = dict.fromkeys(("packets sent", "routes lost"), 0)
+    if end_drops is not None:
+        counts["kernel drops"] = sum(
+            end_drops.get(FIRST_PORT + router_id, 0) - start_drops.get(FIRST_PORT + router_id, 0) for router_id in links
+        )
+    for event in merge_events(glob.glob(os.path.join(work_dir, "logs", "events-*.jsonl"))):
+        # The routers withdrawing their routes as they are stopped is not lost updates.
+        if not start_time <= event["time"] < end_time:
+            continue
+        if event["event"] == "send":
+            counts["packets sent"] += 1
+        elif event["event"] == "route" and event["cost"] == INFINITY:
+            counts["routes lost"] += 1
+
+    # Every router should have a route to every other router, and to every prefix they originate.
+    expected_size = (len(links) - 1) * (num_prefixes + 1)
+    counts["routes missing"] = sum(
+        max(expected_size - sum(route["cost"] < INFINITY for route in routing_table.values()), 0)
+        for routing_table in routing_tables
+    )
+    return counts, work_dir
+
+
+def read_routing_tables(work_dir):
+    """ Read the routing tables the routers have saved to memory. """
+    routing_tables = []
+    for routing_table_filename in glob.glob(os.path.join(work_dir, "router-memory", "routing-table-*.json")):
+        # Skip tables partly written, as they are being saved.
+        with open(routing_table_filename) as routing_table_file:
+            try:
+                routing_tables.append(json.load(routing_table_file))
+            except ValueError:
+                continue
+    return routing_tables
+
+
+def main():
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    num_routers = int(options.pop("routers", 8))
+    num_prefixes = int(options.pop("prefixes", 100))
+    settle = float(options.pop("settle", 15))
+    duration = float(options.pop("duration", 30))
+    seed = int(options.pop("seed", 1))
+    if not 1 < num_routers <= 250 or not 0 < num_prefixes <= 256:
+        print(__doc__)
+        return
+
+    links = make_topology(num_routers, seed)
+    print("{} routers with {} routes each, {} links".format(
+        num_routers, (num_routers - 1) * (num_prefixes + 1), sum(map(len, links.values())) // 2
+    ))
+    results = {}
+    for name, settings in (("without", {}), ("with", options)):
+        print("Running for", settle + duration, "seconds with",
+              ", ".join("{} {}".format(*item) for item in settings.items()) or "the generated configs as they are")
+        results[name], work_dir = run_stress(links, num_prefixes, settings, settle, duration)
+        print("Logs kept in", work_dir)
+
+    print("\n{:16} {:>12} {:>12}".format("", "Without", "With"))
+    for name in results["without"]:
+        print("{:16} {:>12} {:>12}".format(name, results["without"][name], results["with"].get(name, "")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measure how much route summarization reduces the entries routers send and receive, on a generated topology.
+
+Usage (from the scripts directory):
+    python summarization_benchmark.py [options...]
+
+Options:
+    routers=<n>     Number of routers, up to 250, 10 by default.
+    prefixes=<n>    Number of /24 prefixes each router originates, up to 256, 32 by default.
+    duration=<s>    How long to run the routers for, in each mode, 20 seconds by default.
+    seed=<n>        Seed of the generated topology, 1 by default.
+
+Router n originates prefixes 10.n.0.0/24, 10.n.1.0/24, and so on. The topology is a ring of the routers, with random
+extra links. It is run twice, without and then with every router summarizing its prefixes as 10.n.0.0/16. The entries
+sent and received are counted from the routers' event logs. Routers run in a temporary working directory.
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from analyze_events import read_events
+from benchmarks import start_routers
+
+FIRST_PORT = 31000
+UPDATE_PERIOD = 2
+
+
+def make_topology(num_routers, seed):
+    """ Get a map of router ids to maps of neighbour ids to link costs: a ring, with random extra links. """
+    rng = random.Random(seed)
+    links = {router_id: {} for router_id in range(1, num_routers + 1)}
+
+    def link(router_a, router_b, cost):
+        links[router_a][router_b] = links[router_b][router_a] = cost
+
+    for router_id in range(1, num_routers + 1):
+        link(router_id, router_id % num_routers + 1, rng.randint(1, 3))
+    for _ in range(num_routers // 2):
+        router_a, router_b = rng.sample(range(1, num_routers + 1), 2)
+        link(router_a, router_b, rng.randint(1, 3))
+    return links
+
+
+def write_configs(config_dir, links, num_prefixes, summarize):
+    os.makedirs(config_dir)
+    for router_id, neighbours in links.items():
+        config_lines = [
+            "router-id " + str(router_id),
+            "input-ports " + str(FIRST_PORT + router_id),
+            "outputs " + ", ".join(
+                "{}/{}/{}".format(FIRST_PORT + neighbour_id, cost, neighbour_id)
+                for neighbour_id, cost in sorted(neighbours.items())
+            ),
+            "update-period " + str(UPDATE_PERIOD),
+            "prefixes " + ", ".join("10.{}.{}.0/24".format(router_id, i) for i in range(num_prefixes)),
+        ]
+        if summarize:
+            config_lines.append("summary-prefixes 10.{}.0.0/16".format(router_id))
+        config_filename = os.path.join(config_dir, "config-{}.txt".format(router_id))
+        with open(config_filename, "w") as config_file:
+            config_file.write("\n".join(config_lines) + "\n")
+
+
+def count_entries(work_dir):
+    """ Count the packets and entries sent and received, and the size of each routing table. """
+    counts = dict.fromkeys(("packets sent", "entries sent", "packets received", "entries received"), 0)
+    for event_log_filename in glob.glob(os.path.join(work_dir, "logs", "events-*.jsonl")):
+        for event in read_events(event_log_filename):
+            if event["event"] == "send":
+                counts["packets sent"] += 1
+                counts["entries sent"] += event["entries"]
+            elif event["event"] == "receive" and not event["request"]:
+                counts["packets received"] += 1
+                counts["entries received"] += event["entries"]
+    table_sizes = []
+    for routing_table_filename in glob.glob(os.path.join(work_dir, "router-memory", "routing-table-*.json")):
+        # Skip tables left partly written by a router being stopped.
+        with open(routing_table_filename) as routing_table_file:
+            try:
+                table_sizes.append(len(json.load(routing_table_file)))
+            except ValueError:
+                continue
+    counts["routing table size"] = sum(table_sizes) / len(table_sizes) if table_sizes else 0
+    return counts
+
+
+def main():
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    num_routers = int(options.get("routers", 10))
+    num_prefixes = int(options.get("prefixes", 32))
+    duration = float(options.get("duration", 20))
+    seed = int(options.get("seed", 1))
+    if not 1 < num_routers <= 250 or not 0 < num_prefixes <= 256:
+        print(__doc__)
+        return
+
+    links = make_topology(num_routers, seed)
+    results = {}
+    for summarize in (False, True):
+        mode = "summarized" if summarize else "unsummarized"
+        work_dir = tempfile.mkdtemp(prefix="summarization-" + mode + "-")
+        config_dir = os.path.join(work_dir, "configurations")
+        write_configs(config_dir, links, num_prefixes, summarize)
+        print("Running", num_routers, "routers", mode, "for", duration, "seconds, in", work_dir)
+        with start_routers(config_dir):
+            time.sleep(duration)
+        results[mode] = count_entries(work_dir)
+
+    print("\n{:20} {:>14} {:>14} {:>10}".format("", "Unsummarized", "Summarized", "Reduction"))
+    for name in results["unsummarized"]:
+        before, after = results["unsummarized"][name], results["summarized"][name]
+        print("{:20} {:>14.1f} {:>14.1f} {:>9.1f}%".format(
+            name, before, after, (before - after) / before * 100 if before else 0
+        ))
+
+
+if __name__ == "__main__":
+    main()
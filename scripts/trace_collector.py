@@ -0,0 +1,189 @@
+"""
+Assemble the propagation of traced route changes across a network, from the event logs of its routers (recorded by
+running routers with the 'trace' option).
+
+Usage (from the scripts directory):
+    python trace_collector.py <logs-dir-or-event-log-files...> [options...]
+
+Options:
+    trace=<origin>:<seq>    Print the propagation tree of a single route change, hop by hop.
+    dest=<dest>             Only report route changes to the given destination.
+    top=<n>                 Number of traces and of slowest hops to list, 10 by default.
+
+A route change is traced from the router it started at (its origin), through every router its update reached. Each
+router's parent in the propagation tree is the neighbour it first received the change from. For every hop, the wait is
+how long the parent held the change before sending it (its change or receive time to its send time), and whether it
+was sent by a triggered or a periodic update. The transit is how long the packet took to be received and processed.
+Reports the time each change took to reach every router it reached, then the waits and transits of all hops, and the
+slowest hops, to show which hops and timers dominate convergence.
+"""
+
+import glob
+import os
+import sys
+
+from analyze_events import merge_events
+
+DEFAULT_TOP = 10
+
+
+class Trace:
+    def __init__(self, origin, sequence, dest):
+        self.origin = origin
+        self.sequence = sequence
+        self.dest = dest
+        self.start = None  # Time the change was made at its origin.
+        self.changes = {}  # Map router ids to the time they first changed their route for this trace.
+        self.receives = {}  # Map router ids to the (time, neighbour id) they first received this trace.
+        self.sends = {}  # Map (router id, neighbour id) pairs to the (time, periodic) they first sent this trace.
+
+    def get_hops(self):
+        """
+        Get (parent, child, wait, periodic, transit) hops of the propagation tree, in the order they were received. The
+        wait is None if the parent never sent the change to the child, such as when the child first heard it from
+        another neighbour.
+        """
+        hops = []
+        for router_id, (receive_time, parent) in sorted(self.receives.items(), key=lambda item: item[1][0]):
+            ready_time = self.changes.get(parent, self.receives.get(parent, (None,))[0])
+            send_time, periodic = self.sends.get((parent, router_id), (None, None))
+            if ready_time is None or send_time is None:
+                hops.append((parent, router_id, None, None, None))
+                continue
+            hops.append((parent, router_id, max(send_time - ready_time, 0), periodic, receive_time - send_time))
+        return hops
+
+    def get_reach_time(self):
+        """ Get how long the change took to reach every router it reached. """
+        if self.start is None or not self.receives:
+            return 0
+        return max(receive_time for receive_time, _ in self.receives.values()) - self.start
+
+
+def collect_traces(events, dest_filter=None):
+    """ Assemble the traces of every traced route change in a stream of events. """
+    traces = {}
+    for event in events:
+        if not event["event"].startswith("trace-"):
+            continue
+        if dest_filter is not None and str(event["dest"]) != dest_filter:
+            continue
+        key = (event["origin"], event["sequence"])
+        trace = traces.get(key)
+        if trace is None:
+            trace = traces[key] = Trace(event["origin"], event["sequence"], event["dest"])
+        router_id = event["router"]
+        now = event["time"]
+        if event["event"] == "trace-change":
+            trace.changes.setdefault(router_id, now)
+            if router_id == trace.origin and trace.start is None:
+                trace.start = now
+        elif event["event"] == "trace-receive":
+            # The origin hearing its own change back is not part of the propagation tree.
+            if router_id != trace.origin:
+                trace.receives.setdefault(router_id, (now, event["neighbour"]))
+        elif event["event"] == "trace-send":
+            trace.sends.setdefault((router_id, event["neighbour"]), (now, event["periodic"]))
+    return traces
+
+
+def print_tree(trace):
+    """ Print the propagation tree of a trace, each router indented under the neighbour it first heard it from. """
+    print("Trace {}:{} of the route to {}".format(trace.origin, trace.sequence, trace.dest))
+    if trace.start is None:
+        print("  The change was not logged at its origin, router {}".format(trace.origin))
+        return
+    children = {}
+    hops = {}
+    for parent, child, wait, periodic, transit in trace.get_hops():
+        children.setdefault(parent, []).append(child)
+        hops[child] = (wait, periodic, transit)
+
+    def print_router(router_id, depth):
+        if router_id == trace.origin:
+            line = "router {} changed its route".format(router_id)
+        else:
+            receive_time = trace.receives[router_id][0]
+            wait, periodic, transit = hops[router_id]
+            line = "router {} at {:8.3f}s".format(router_id, receive_time - trace.start)
+            if wait is not None:
+                line += ", waited {:.3f}s for a {} update, transit {:.3f}s".format(
+                    wait, "periodic" if periodic else "triggered", transit
+                )
+            if router_id in trace.changes:
+                line += ", changed its route {:.3f}s later".format(trace.changes[router_id] - receive_time)
+        print("  " + "  " * depth + line)
+        for child in children.get(router_id, []):
+            print_router(child, depth + 1)
+
+    print_router(trace.origin, 0)
+    print("  Reached {} routers in {:.3f}s".format(len(trace.receives), trace.get_reach_time()))
+
+
+def report(traces, top):
+    traces = [trace for trace in traces.values() if trace.start is not None]
+    if not traces:
+        print("No traced route changes")
+        return
+    first_start = min(trace.start for trace in traces)
+
+    print("{} traced route changes. Slowest to reach every router (times relative to the first change):".format(
+        len(traces)
+    ))
+    for trace in sorted(traces, key=Trace.get_reach_time, reverse=True)[:top]:
+        print("  trace={}:{:<12} destination {:>18}: {:10.3f}s, reached {:4} routers in {:7.3f}s".format(
+            trace.origin, trace.sequence, str(trace.dest), trace.start - first_start, len(trace.receives),
+            trace.get_reach_time()
+        ))
+
+    hops = [(trace,) + hop for trace in traces for hop in trace.get_hops() if hop[2] is not None]
+    if not hops:
+        return
+    print("\nHops: {}".format(len(hops)))
+    for name, periodic in (("Triggered", False), ("Periodic", True)):
+        waits = [hop[3] for hop in hops if hop[4] == periodic]
+        if waits:
+            print("  {:9} updates: {:6} hops, wait mean {:7.3f}s max {:7.3f}s, {:5.1f}% of all waiting".format(
+                name, len(waits), sum(waits) / len(waits), max(waits),
+                sum(waits) / sum(hop[3] for hop in hops) * 100 if any(hop[3] for hop in hops) else 0
+            ))
+    transits = [hop[5] for hop in hops]
+    print("  Transit: mean {:.3f}s max {:.3f}s".format(sum(transits) / len(transits), max(transits)))
+
+    print("\nSlowest hops:")
+    for trace, parent, child, wait, periodic, transit in sorted(hops, key=lambda hop: hop[3] + hop[5], reverse=True)[
+        :top
+    ]:
+        print("  trace={}:{:<12} router {:5} -> {:5}: waited {:7.3f}s for a {:9} update, transit {:.3f}s".format(
+            trace.origin, trace.sequence, parent, child, wait, "periodic" if periodic else "triggered", transit
+        ))
+
+
+def main():
+    args = sys.argv[1:]
+    paths = [arg for arg in args if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in args if "=" in arg)
+    if not paths:
+        print(__doc__)
+        return
+    filenames = []
+    for path in paths:
+        filenames += sorted(glob.glob(os.path.join(path, "events-*.jsonl"))) if os.path.isdir(path) else [path]
+    if not filenames:
+        print("No event logs found")
+        return
+
+    traces = collect_traces(merge_events(filenames), options.get("dest"))
+    if "trace" in options:
+        origin, sequence = options["trace"].split(":")
+        trace = traces.get((int(origin), int(sequence)))
+        if trace is None:
+            print("No trace", options["trace"])
+            return
+        print_tree(trace)
+    else:
+        report(traces, int(options.get("top", DEFAULT_TOP)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the steady-state update traffic and CPU use of an example network, with and without extra config settings
+(such as max-update-period).
+
+Usage (from the scripts directory):
+    python update_period_benchmark.py <example-num> [options...] [<setting>=<value>...]
+
+Options:
+    settle=<seconds>    How long to let the network converge before measuring, 60 seconds by default.
+    measure=<seconds>   How long to measure for, 120 seconds by default.
+
+Every router of the example is run with its event log. Once settled, the packets and entries sent, the route changes
+and the CPU time used by all routers are measured. This is done twice: with the example's configs as they are, then
+with each given setting added to every config, such as 'max-update-period=40'. Routes lost (set to infinity) while
+measuring would show timeouts that are no longer safe. CPU time is read from /proc, so is only measured on Linux.
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from analyze_events import merge_events
+from benchmarks import copy_example, start_routers
+
+DEFAULT_SETTLE = 60
+DEFAULT_MEASURE = 120
+INFINITY = 16
+
+
+def get_cpu_seconds(pid):
+    """ Get the CPU time used by a process and the children it has waited for, or None if it cannot be read. """
+    try:
+        with open("/proc/" + str(pid) + "/stat") as stat_file:
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # utime, stime, cutime and cstime are the 14th to 17th fields, counting the pid and command as the first two.
+    return sum(int(field) for field in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+
+
+def measure_example(example_num, settings, settle, measure):
+    """ Run an example with the given settings added to its configs, measuring it once settled. """
+    work_dir = tempfile.mkdtemp(prefix="update-period-")
+    with start_routers(copy_example(example_num, work_dir), settings) as processes:
+        time.sleep(settle)
+        start = time.monotonic()
+        start_cpu = [get_cpu_seconds(process.pid) for process in processes.values()]
+        time.sleep(measure)
+        end_cpu = [get_cpu_seconds(process.pid) for process in processes.values()]
+        end = time.monotonic()
+
+    counts = dict.fromkeys(("packets sent", "entries sent", "route changes", "routes lost"), 0)
+    for event in merge_events(glob.glob(os.path.join(work_dir, "logs", "events-*.jsonl"))):
+        if not start <= event["time"] < end:
+            continue
+        if event["event"] == "send":
+            counts["packets sent"] += 1
+            counts["entries sent"] += event["entries"]
+        elif event["event"] == "route":
+            counts["route changes"] += 1
+            counts["routes lost"] += event["cost"] == INFINITY
+    counts["packets sent per second"] = counts["packets sent"] / (end - start)
+    if None not in start_cpu + end_cpu:
+        counts["CPU seconds"] = sum(end_cpu) - sum(start_cpu)
+    return counts, work_dir
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        return
+    example_num = args[0]
+    options = dict(arg.split("=", 1) for arg in args[1:] if "=" in arg)
+    settle = float(options.pop("settle", DEFAULT_SETTLE))
+    measure = float(options.pop("measure", DEFAULT_MEASURE))
+
+    results = {}
+    for name, settings in (("without", {}), ("with", options)):
+        print("Running example", example_num, "with", ", ".join("{} {}".format(*item) for item in settings.items()) or
+              "its configs as they are", "measuring for", measure, "seconds after", settle, "seconds")
+        results[name], work_dir = measure_example(example_num, settings, settle, measure)
+        print("Logs kept in", work_dir)
+
+    print("\n{:24} {:>12} {:>12} {:>10}".format("Once settled", "Without", "With", "Change"))
+    for name in results["without"]:
+        before, after = results["without"][name], results["with"].get(name)
+        if after is None:
+            continue
+        print("{:24} {:>12.1f} {:>12.1f} {:>9.1f}%".format(
+            name, before, after, (after - before) / before * 100 if before else 0
+        ))
+
+
+if __name__ == "__main__":
+    main()